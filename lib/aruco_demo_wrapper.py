@@ -10,7 +10,7 @@ import numpy as np
 
 from collections import OrderedDict
 
-from lib.misc import get_first_dict_item
+from lib.misc import ModelCache, get_first_dict_item
 
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -27,37 +27,128 @@ class ArucoDemo:
     FONTSCALE = 1
     ARROWSCALE = 0.35
     
-    def __init__(self):
-        self._name_to_model_dict = self._make_detectors()
-        self._num_detectors = len(self._name_to_model_dict)
-        self._model_select, _ = get_first_dict_item(self._name_to_model_dict)
+    # Pre-define which aruco detectors we'll use
+    ARU_DICTS_LUT = OrderedDict({
+        "4x4": cv2.aruco.DICT_4X4_1000,
+        "5x5": cv2.aruco.DICT_5X5_1000,
+        "6x6": cv2.aruco.DICT_6X6_1000,
+        "7x7": cv2.aruco.DICT_7X7_1000,
+    })
+    
+    # Name of the option which searches for markers from all dictionaries
+    AUTO_NAME = "auto"
+    
+    def __init__(self, model_cache = None):
+        
+        # Detectors are only created when first used
+        self._model_cache = ModelCache() if model_cache is None else model_cache
+        self._num_detectors = len(self.ARU_DICTS_LUT)
+        self._model_select, _ = get_first_dict_item(self.ARU_DICTS_LUT)
+        
+        # Tracking settings & state (disabled by default, see enable_tracking)
+        self._use_tracking = False
+        self._full_scan_interval = 10
+        self._roi_margin = 0.5
+        self._track_xys = ()
+        self._track_key = None
+        self._frames_since_full_scan = 0
+        
+        # Full-frame detection happens on a downscaled copy of large frames (see set_detection_budget)
+        self._max_detection_px = None
     
     def get_model_names(self) -> list[str]:
-        return list(self._name_to_model_dict.keys())
+        return [*self.ARU_DICTS_LUT.keys(), self.AUTO_NAME]
     
     def set_model_select(self, model_select: str):
         self._model_select = model_select
         return self
     
+    def enable_tracking(self, enable = True, full_scan_interval = 10, roi_margin = 0.5):
+        
+        '''
+        When tracking is enabled, markers are only searched for in regions around the markers found on
+        the previous frame, which is much faster than searching the whole frame (especially for large frames)
+        A full frame search still happens every 'full_scan_interval' frames (to find new markers) or whenever
+        a tracked marker is lost. The roi_margin sets how far the search regions extend past each
+        marker, as a fraction of the marker size
+        Note: Tracking assumes that all frames come from the same video source!
+        '''
+        
+        self._use_tracking = enable
+        self._full_scan_interval = full_scan_interval
+        self._roi_margin = roi_margin
+        self._track_xys = ()
+        self._track_key = None
+        
+        return self
+    
+    def set_detection_budget(self, max_megapixels = None):
+        
+        '''
+        Limit the size of the image used to search for markers. Larger frames are downscaled (by halving,
+        as with an image pyramid) until they fit within the budget, and the detected corners are then
+        refined on the original frame. This keeps detection fast & accurate, no matter the frame size
+        Use None to always search the frame as-is
+        '''
+        
+        self._max_detection_px = None if max_megapixels is None else int(max_megapixels * 1e6)
+        
+        return self
+    
     def process_frame(self, frame):
         
-        detector = self._name_to_model_dict[self._model_select]
-        aru_xys_px, aru_ids, _ = detector.detectMarkers(frame)
-        results = (aru_xys_px, aru_ids)
+        '''
+        Detect markers in a frame, using the selected dictionary (or all dictionaries, if using 'auto')
+        Returns results as: (marker_corners, marker_ids, dictionary_names, frame_hw)
+        where dictionary_names is a list naming the dictionary of each marker when using 'auto', otherwise None
+        and frame_hw is the size of the given frame (corners are given in the coordinates of this frame)
+        '''
+        
+        frame_hw = frame.shape[0:2]
+        if not self._use_tracking:
+            return (*self._detect_full_frame(frame), frame_hw)
         
-        return results
+        # Restart tracking if the detector or frame sizing changes, since old tracks won't apply
+        track_key = (self._model_select, frame.shape)
+        num_tracked = len(self._track_xys)
+        need_full_scan = (num_tracked == 0) or (track_key != self._track_key)
+        need_full_scan |= (self._frames_since_full_scan >= self._full_scan_interval)
+        
+        # Search near previous markers first, falling back to a full search if any markers are lost
+        if not need_full_scan:
+            track_rects = get_expanded_rects(self._track_xys, self._roi_margin, frame.shape)
+            results = self._detect_in_rects(frame, track_rects)
+            need_full_scan = len(results[0]) < num_tracked
+        if need_full_scan:
+            results = self._detect_full_frame(frame)
+            self._frames_since_full_scan = 0
+        else:
+            self._frames_since_full_scan += 1
+        
+        self._track_xys = results[0]
+        self._track_key = track_key
+        
+        return (*results, frame_hw)
     
     def draw_results(self, results, display_frame):
         
         # For clarity
-        aru_xys_px, aru_ids = results
+        aru_xys_px, aru_ids, dict_names, frame_hw = results
+        if dict_names is None:
+            dict_names = [None] * len(aru_xys_px)
         
         # Bail if there are no detection results
         no_data = len(aru_xys_px) == 0
         if no_data:
             return display_frame
         
-        for pt_id, pts_xy_px in zip(aru_ids, aru_xys_px):
+        # Scale corners to the display, if results came from a differently sized frame
+        disp_h, disp_w = display_frame.shape[0:2]
+        if (disp_h, disp_w) != tuple(frame_hw):
+            disp_scale = np.float32((disp_w / frame_hw[1], disp_h / frame_hw[0]))
+            aru_xys_px = [xys_px * disp_scale for xys_px in aru_xys_px]
+        
+        for pt_id, pts_xy_px, dict_name in zip(aru_ids, aru_xys_px, dict_names):
             
             # For convenience
             pt_id = pt_id.ravel()[0]
@@ -81,37 +172,223 @@ class ArucoDemo:
             # Draw main detection box
             draw_polygon(display_frame, pts_xy_i32, self.BOX_COLOR)
             
-            # Draw ID text
-            id_txt = f"ID: {pt_id}"
+            # Draw ID text (including the dictionary, if known)
+            id_txt = f"ID: {pt_id}" if dict_name is None else f"{dict_name}: {pt_id}"
             (txt_w, txt_h), txt_baseline = cv2.getTextSize(id_txt, self.FONT, self.FONTSCALE, 3)
             txt_xy = (mid_x - txt_w//2, mid_y + txt_h//2)
             draw_text(display_frame, id_txt, txt_xy, self.TEXT_COLOR)
         
         return display_frame
 
-    def _make_detectors(self) -> dict:
+    def _detect_full_frame(self, frame):
+        
+        '''
+        Helper used to search the full frame for markers. Frames larger than the detection budget are
+        searched at a lower resolution, with corners then refined to sub-pixel accuracy on the original frame
+        '''
+        
+        pyramid_level = get_pyramid_level(frame.shape, self._max_detection_px)
+        if pyramid_level == 0:
+            return self._detect(frame)
+        
+        # Detect on downscaled frame
+        frame_h, frame_w = frame.shape[0:2]
+        scale_factor = 2 ** pyramid_level
+        small_wh = (max(1, frame_w // scale_factor), max(1, frame_h // scale_factor))
+        small_frame = cv2.resize(frame, dsize=small_wh, interpolation=cv2.INTER_AREA)
+        aru_xys_px, aru_ids, dict_names = self._detect(small_frame)
+        if len(aru_xys_px) == 0:
+            return aru_xys_px, aru_ids, dict_names
+        
+        # Map corners back to full-size pixel coordinates, then refine them using the full-size frame
+        small_xys_px = np.concatenate([xys_px.reshape(-1, 2) for xys_px in aru_xys_px])
+        full_xys_px = (small_xys_px + 0.5) * np.float32((frame_w / small_wh[0], frame_h / small_wh[1])) - 0.5
+        full_xys_px = refine_corners(frame, full_xys_px, search_radius_px = scale_factor + 2)
+        aru_xys_px = tuple(full_xys_px.reshape(-1, 1, 4, 2))
+        
+        return aru_xys_px, aru_ids, dict_names
+    
+    def _detect(self, frame):
+        
+        ''' Helper used to run detection using the selected dictionary (or all dictionaries, if using auto) '''
+        
+        if self._model_select == self.AUTO_NAME:
+            return self._detect_all_dicts(frame)
+        
+        aru_xys_px, aru_ids, _ = self._get_detector(self._model_select).detectMarkers(frame)
+        
+        return (aru_xys_px, aru_ids, None)
+    
+    def _detect_all_dicts(self, frame):
+        
+        '''
+        Helper used to detect markers from all dictionaries, without searching the whole frame for each one
+        The first dictionary searches the full frame, which also finds every marker-like shape that it
+        couldn't decode (the 'rejected' candidates). The remaining dictionaries are only searched
+        for in small regions around these candidates
+        '''
         
-        # Pre-define which aruco detectors we'll load
-        ARU_DICTS_LUT = {
-            "4x4": cv2.aruco.DICT_4X4_1000,
-            "5x5": cv2.aruco.DICT_5X5_1000,
-            "6x6": cv2.aruco.DICT_6X6_1000,
-            "7x7": cv2.aruco.DICT_7X7_1000,
-        }
+        first_name, *other_names = self.ARU_DICTS_LUT.keys()
+        aru_xys_px, aru_ids, rejected_xys_px = self._get_detector(first_name).detectMarkers(frame)
+        aru_xys_list = list(aru_xys_px)
+        aru_ids_list = [] if aru_ids is None else [aru_ids]
+        dict_names_list = [first_name] * len(aru_xys_list)
         
-        name_to_detector_dict = OrderedDict()
-        for name, aru_dict in ARU_DICTS_LUT.items():
-            aru_dict = cv2.aruco.getPredefinedDictionary(aru_dict)
-            aru_params = cv2.aruco.DetectorParameters()
-            aru_detector = cv2.aruco.ArucoDetector(aru_dict, aru_params)
-            name_to_detector_dict[name] = aru_detector
+        # Try decoding the remaining candidates using every other dictionary
+        candidate_rects = get_expanded_rects(rejected_xys_px, 0.25, frame.shape)
+        for dict_name in other_names:
+            if len(candidate_rects) == 0:
+                break
+            dict_xys_px, dict_ids = self._detect_in_rects(frame, candidate_rects, dict_name)[0:2]
+            aru_xys_list.extend(dict_xys_px)
+            aru_ids_list.extend([] if dict_ids is None else [dict_ids])
+            dict_names_list.extend([dict_name] * len(dict_xys_px))
+        aru_ids = np.vstack(aru_ids_list) if len(aru_ids_list) > 0 else None
         
-        return name_to_detector_dict
+        return tuple(aru_xys_list), aru_ids, dict_names_list
+    
+    def _detect_in_rects(self, frame, rects_list, dict_name = None):
+        
+        '''
+        Helper used to detect markers only within the given regions (x1, y1, x2, y2) of a frame
+        Uses the selected dictionary (or all dictionaries, if using auto) unless a dictionary name is given
+        Returns detections in the same format as process_frame (with coordinates in full-frame space)
+        '''
+        
+        # Detect within each region, offsetting results back into full-frame coordinates
+        aru_xys_list, aru_ids_list, dict_names_list = [], [], []
+        for x1, y1, x2, y2 in rects_list:
+            roi_frame = frame[y1:y2, x1:x2]
+            if dict_name is None:
+                roi_xys_px, roi_ids, roi_dict_names = self._detect(roi_frame)
+            else:
+                roi_xys_px, roi_ids, _ = self._get_detector(dict_name).detectMarkers(roi_frame)
+                roi_dict_names = [dict_name] * len(roi_xys_px)
+            if roi_ids is None:
+                continue
+            roi_offset = np.float32((x1, y1))
+            aru_xys_list.extend(xys_px + roi_offset for xys_px in roi_xys_px)
+            aru_ids_list.append(roi_ids)
+            dict_names_list.extend(roi_dict_names if roi_dict_names is not None else [None] * len(roi_xys_px))
+        aru_ids = np.vstack(aru_ids_list) if len(aru_ids_list) > 0 else None
+        
+        # Only report dictionary names when searching more than one dictionary
+        is_auto = (dict_name is not None) or (self._model_select == self.AUTO_NAME)
+        
+        return tuple(aru_xys_list), aru_ids, (dict_names_list if is_auto else None)
+    
+    def _get_detector(self, dict_name):
+        
+        ''' Helper used to get the aruco detector for a dictionary, which is created on first use '''
+        
+        return self._model_cache.get(("aruco", dict_name), lambda: self._make_detector(dict_name))
+    
+    def _make_detector(self, model_name):
+        
+        aru_dict = cv2.aruco.getPredefinedDictionary(self.ARU_DICTS_LUT[model_name])
+        aru_params = cv2.aruco.DetectorParameters()
+        aru_detector = cv2.aruco.ArucoDetector(aru_dict, aru_params)
+        
+        return aru_detector
 
 
 # ---------------------------------------------------------------------------------------------------------------------
 #%% Functions
 
+def get_pyramid_level(frame_shape, max_pixels = None) -> int:
+    
+    ''' Helper used to get the number of times a frame must be halved in size to fit within a pixel budget '''
+    
+    if max_pixels is None:
+        return 0
+    
+    frame_h, frame_w = frame_shape[0:2]
+    pyramid_level = 0
+    while (frame_h * frame_w) / (4 ** pyramid_level) > max_pixels:
+        pyramid_level += 1
+    
+    return pyramid_level
+
+def refine_corners(frame, xys_px, search_radius_px = 4, corners_per_marker = 4):
+    
+    '''
+    Helper used to refine (approximate) corner locations to sub-pixel accuracy
+    Each marker (i.e. every group of 'corners_per_marker' corners) is refined using a small crop around
+    its own corners, so that only the area around each marker is converted to grayscale
+    Returns refined corners as an Nx2 float32 array
+    '''
+    
+    frame_h, frame_w = frame.shape[0:2]
+    border_px = search_radius_px + 2
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+    win_size = (search_radius_px, search_radius_px)
+    
+    refined_xys_px = np.float32(xys_px).reshape(-1, 2).copy()
+    for idx1 in range(0, len(refined_xys_px), corners_per_marker):
+        marker_xys_px = refined_xys_px[idx1:(idx1 + corners_per_marker)]
+        
+        # Crop out the area around the marker corners
+        x1, y1 = np.maximum(0, np.int32(np.floor(np.min(marker_xys_px, axis=0))) - border_px)
+        x2, y2 = np.int32(np.ceil(np.max(marker_xys_px, axis=0))) + border_px + 1
+        x2, y2 = min(frame_w, x2), min(frame_h, y2)
+        crop_frame = frame[y1:y2, x1:x2]
+        crop_gray = cv2.cvtColor(crop_frame, cv2.COLOR_BGR2GRAY) if crop_frame.ndim == 3 else crop_frame
+        
+        # Refine corners, in crop coordinates
+        crop_offset = np.float32((x1, y1))
+        crop_xys_px = (marker_xys_px - crop_offset).reshape(-1, 1, 2)
+        crop_xys_px = cv2.cornerSubPix(crop_gray, crop_xys_px, win_size, (-1, -1), criteria)
+        marker_xys_px[:] = crop_xys_px.reshape(-1, 2) + crop_offset
+    
+    return refined_xys_px
+
+def get_expanded_rects(xys_px_list, margin_factor, frame_shape):
+    
+    '''
+    Helper used to get (merged) regions around a list of marker corners, expanded
+    by a fraction of the marker size (plus a few pixels for a minimum border)
+    Returns a list of non-overlapping rectangles, as (x1, y1, x2, y2)
+    '''
+    
+    frame_h, frame_w = frame_shape[0:2]
+    rects_list = []
+    for xys_px in xys_px_list:
+        (x1, y1), (x2, y2) = np.min(xys_px[0], axis=0), np.max(xys_px[0], axis=0)
+        margin_px = 8 + margin_factor * max(x2 - x1, y2 - y1)
+        x1, y1 = max(0, int(x1 - margin_px)), max(0, int(y1 - margin_px))
+        x2, y2 = min(frame_w, int(x2 + margin_px) + 1), min(frame_h, int(y2 + margin_px) + 1)
+        rects_list.append((x1, y1, x2, y2))
+    
+    return merge_overlapping_rects(rects_list)
+
+def merge_overlapping_rects(rects_list):
+    
+    '''
+    Helper used to combine overlapping rectangles (given as x1, y1, x2, y2) into their bounding rectangles
+    Returns a list of non-overlapping rectangles
+    '''
+    
+    merged_list = list(rects_list)
+    is_overlapping = lambda a, b: a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+    
+    # Keep merging pairs of rectangles until nothing overlaps
+    found_overlap = True
+    while found_overlap:
+        found_overlap = False
+        for idx_a in range(len(merged_list)):
+            for idx_b in range(idx_a + 1, len(merged_list)):
+                rect_a, rect_b = merged_list[idx_a], merged_list[idx_b]
+                if is_overlapping(rect_a, rect_b):
+                    merged_list[idx_a] = (min(rect_a[0], rect_b[0]), min(rect_a[1], rect_b[1]),
+                                          max(rect_a[2], rect_b[2]), max(rect_a[3], rect_b[3]))
+                    merged_list.pop(idx_b)
+                    found_overlap = True
+                    break
+            if found_overlap:
+                break
+    
+    return merged_list
+
 def draw_line(frame, xy1, xy2, fg_color = (0,255, 0),
               fg_thickness = 3, bg_color = (0,0,0), bg_thickness = 5, line_type = cv2.LINE_AA):
     
@@ -5,12 +5,16 @@
 # ---------------------------------------------------------------------------------------------------------------------
 #%% Imports
 
+import os
+import os.path as osp
+
 import cv2
 import numpy as np
 import onnxruntime
 
 from lib.downloading import download_missing_model_files
-from lib.misc import get_first_dict_item, get_file_to_path_lut
+from lib.depth_processing import get_depth_proc_wh
+from lib.misc import ModelCache, get_first_dict_item, get_file_to_path_lut, get_path_size_mb
 
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -18,46 +22,94 @@ from lib.misc import get_first_dict_item, get_file_to_path_lut
 
 class DepthDemo:
     
-    # Hard-coded configuration for depth-anything models
+    # Hard-coded configuration for depth-anything models (default processing size & patch size of the model)
     _proc_wh = (518, 518)
+    _patch_size_px = 14
     _mean_rgb = np.float32([0.485, 0.456, 0.406])
     _std_rgb = np.float32([0.229, 0.224, 0.225])
     
+    # Normalization, folded into a single scale & offset per channel: (x/255 - mean)/std = x*scale + offset
+    _norm_scale_rgb = np.float32(1.0 / (255.0 * _std_rgb))
+    _norm_offset_rgb = np.float32(-_mean_rgb / _std_rgb)
+    
     # For reference, download links to model files
     _download_urls = [
         "https://github.com/fabio-sim/Depth-Anything-ONNX/releases/download/v1.0.0/depth_anything_vits14.onnx",
         "https://github.com/fabio-sim/Depth-Anything-ONNX/releases/download/v1.0.0/depth_anything_vitb14.onnx",
     ]
     
-    def __init__(self, models_folder_path = "models/depth"):
+    # Lookups for onnxruntime session settings
+    _exec_mode_lut = {
+        "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+        "parallel": onnxruntime.ExecutionMode.ORT_PARALLEL,
+    }
+    _graph_opt_lut = {
+        "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    
+    def __init__(self, models_folder_path = "models/depth", model_cache = None,
+                 intra_op_threads = 0, inter_op_threads = 0, execution_mode = "sequential",
+                 graph_optimization = "all", cache_optimized_models = True, proc_size = 518, keep_aspect = False):
         
         # Get model files if needed
         download_missing_model_files(self._download_urls, models_folder_path)
         
-        self._name_to_model_dict = self._load_models(models_folder_path)
-        self._num_models = len(self._name_to_model_dict)
-        self._model_select, _ = get_first_dict_item(self._name_to_model_dict)
+        # Session settings (0 threads lets onnxruntime decide)
+        assert execution_mode in self._exec_mode_lut, f"Unknown execution mode: {execution_mode}"
+        assert graph_optimization in self._graph_opt_lut, f"Unknown graph optimization level: {graph_optimization}"
+        self._intra_op_threads = intra_op_threads
+        self._inter_op_threads = inter_op_threads
+        self._execution_mode = execution_mode
+        self._graph_optimization = graph_optimization
+        
+        # Optimized models are stored in a sub-folder, so they don't show up as separate models
+        self._optimized_folder_path = osp.join(models_folder_path, "optimized") if cache_optimized_models else None
+        
+        # Models are only loaded when first used
+        self._model_cache = ModelCache() if model_cache is None else model_cache
+        self._name_to_path_dict = get_file_to_path_lut(models_folder_path, allowable_exts = [".onnx"])
+        self._num_models = len(self._name_to_path_dict)
+        self._model_select, _ = get_first_dict_item(self._name_to_path_dict)
+        
+        # Processing resolution, which only applies to models that support dynamic input sizing
+        self._proc_size = proc_size
+        self._keep_aspect = keep_aspect
+        self._warned_fixed_size = set()
+        
+        # Storage for re-usable input/output buffers & onnxruntime binding (set up on first use of each model)
+        self._binding = None
     
     def get_model_names(self) -> list[str]:
-        return list(self._name_to_model_dict.keys())
+        return list(self._name_to_path_dict.keys())
     
     def set_model_select(self, model_select: str):
         self._model_select = model_select
     
     def process_frame(self, frame_bgr):
         
-        ort_session = self._name_to_model_dict[self._model_select]
+        '''
+        Run the selected depth model on a frame. Pre-processing & inference write into
+        pre-allocated buffers, so the returned depth map is only valid until the next call!
+        '''
+        
+        ort_session = self._get_selected_model()
+        proc_wh = self._get_proc_wh(ort_session, frame_bgr.shape)
+        binding = self._get_binding(ort_session, proc_wh)
+        _, io_binding, scaled_bgr, input_nchw, output_data = binding
         
-        # Image must be RGB ordered, with CxHxW shape, with normalized mean/standard deviation
-        frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-        scaled_frame = cv2.resize(frame_rgb, dsize=self._proc_wh)
-        scaled_frame = (np.float32(scaled_frame)/255.0 - self._mean_rgb) / self._std_rgb
-        scaled_frame = np.transpose(scaled_frame, (2, 0, 1))
-        scaled_frame = np.expand_dims(scaled_frame, axis=0)
+        write_depth_input(frame_bgr, scaled_bgr, input_nchw)
+        ort_session.run_with_iobinding(io_binding)
         
-        depth_result = ort_session.run(None, {"image": scaled_frame})[0].squeeze()
+        return output_data.squeeze()
+    
+    def process_frames(self, frames_list) -> list:
+        
+        ''' Run the selected depth model on several frames. Unlike process_frame, results are not overwritten '''
         
-        return depth_result
+        return [self.process_frame(frame).copy() for frame in frames_list]
     
     def draw_results(self, depth_result_1ch, display_shape, use_high_contrast = True):
         
@@ -74,18 +126,129 @@ class DepthDemo:
         
         return depth_color
     
-    def _load_models(self, folder_path):
+    def _get_selected_model(self):
+        
+        ''' Helper used to get the selected depth model (onnx session), which is loaded on first use '''
+        
+        model_path = self._name_to_path_dict[self._model_select]
+        make_ort = lambda: self._make_session(model_path)
+        
+        return self._model_cache.get(("depth", self._model_select), make_ort, lambda: get_path_size_mb(model_path))
+    
+    def _make_session(self, model_path):
+        
+        '''
+        Helper used to create an onnx session using the configured session settings
+        If enabled, the optimized graph is saved on first load and re-used afterwards (as long as it's
+        newer than the original model file), which avoids paying for graph optimization on every start up
+        '''
+        
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.intra_op_num_threads = self._intra_op_threads
+        sess_options.inter_op_num_threads = self._inter_op_threads
+        sess_options.execution_mode = self._exec_mode_lut[self._execution_mode]
+        sess_options.graph_optimization_level = self._graph_opt_lut[self._graph_optimization]
+        
+        # Load un-optimized model directly if caching is disabled (or pointless)
+        no_caching = (self._optimized_folder_path is None) or (self._graph_optimization == "disable")
+        if no_caching:
+            return onnxruntime.InferenceSession(model_path, sess_options, providers=["CPUExecutionProvider"])
+        
+        # Optimizations beyond 'extended' are hardware-specific (e.g. memory layouts), so they're not saved
+        # -> Saved models are optimized up to 'extended', with any remaining optimizations applied on load
+        save_level = "extended" if self._graph_optimization == "all" else self._graph_optimization
+        model_name = osp.splitext(osp.basename(model_path))[0]
+        optimized_path = osp.join(self._optimized_folder_path, f"{model_name}_{save_level}.onnx")
+        is_cached = osp.exists(optimized_path) and osp.getmtime(optimized_path) >= osp.getmtime(model_path)
+        if not is_cached:
+            
+            # Save optimized model for re-use on later runs
+            print("", f"Optimizing depth model: {model_name} (this only happens once)", sep="\n", flush=True)
+            os.makedirs(self._optimized_folder_path, exist_ok=True)
+            save_options = onnxruntime.SessionOptions()
+            save_options.graph_optimization_level = self._graph_opt_lut[save_level]
+            save_options.optimized_model_filepath = optimized_path
+            onnxruntime.InferenceSession(model_path, save_options, providers=["CPUExecutionProvider"])
+        
+        # Use the previously optimized model, only applying the optimizations that weren't saved
+        load_level = self._graph_optimization if self._graph_optimization == "all" else "disable"
+        sess_options.graph_optimization_level = self._graph_opt_lut[load_level]
+        
+        return onnxruntime.InferenceSession(optimized_path, sess_options, providers=["CPUExecutionProvider"])
+    
+    def _get_proc_wh(self, ort_session, frame_shape) -> tuple[int, int]:
+        
+        '''
+        Helper used to decide on the processing resolution for a frame. Models with a fixed input
+        size must use that size, otherwise the configured processing size is used
+        '''
+        
+        # Use fixed model sizing, if present (dynamic sizes show up as strings or None)
+        _, _, model_h, model_w = ort_session.get_inputs()[0].shape
+        is_fixed_size = isinstance(model_h, int) and isinstance(model_w, int)
+        if is_fixed_size:
+            fixed_wh = (model_w, model_h)
+            is_configured = (self._proc_size == max(fixed_wh)) and not self._keep_aspect
+            if not is_configured and self._model_select not in self._warned_fixed_size:
+                self._warned_fixed_size.add(self._model_select)
+                print("", f"Depth model ({self._model_select}) only supports a size of: {model_w}x{model_h}",
+                      sep="\n", flush=True)
+            return fixed_wh
+        
+        return get_depth_proc_wh(frame_shape, self._proc_size, self._keep_aspect, self._patch_size_px)
+    
+    def _get_binding(self, ort_session, proc_wh):
         
         '''
-        Helper which loads multiple depth models, smallest first
-        Returns a dictionary whose keys are the model names (no file extension) and
-        have corresponding values of the models (onnx sessions) themselves
+        Helper used to set up input/output buffers bound to the given session, so that inference doesn't
+        allocate new arrays on every frame. Only the binding for the most recent session & sizing is kept
+        Returns: ort_session, io_binding, scaled_bgr_uint8, input_nchw_float32, output_float32
         '''
         
-        # Helper used to create onnx sessions
-        make_ort = lambda path: onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        # Re-use the existing binding if nothing has changed
+        proc_w, proc_h = proc_wh
+        if self._binding is not None and self._binding[0] is ort_session:
+            if self._binding[2].shape[0:2] == (proc_h, proc_w):
+                return self._binding
+        
+        # Drop old binding first, so we don't hold on to sessions that were unloaded
+        self._binding = None
+        scaled_bgr = np.empty((proc_h, proc_w, 3), dtype=np.uint8)
+        input_nchw = np.zeros((1, 3, proc_h, proc_w), dtype=np.float32)
+        
+        # Run once to figure out the output shape (in case the model uses dynamic sizing)
+        input_name = ort_session.get_inputs()[0].name
+        output_name = ort_session.get_outputs()[0].name
+        output_shape = ort_session.run([output_name], {input_name: input_nchw})[0].shape
+        output_data = np.empty(output_shape, dtype=np.float32)
         
-        name_to_path_dict = get_file_to_path_lut(folder_path, allowable_exts = [".onnx"])
-        name_to_model_dict = {name: make_ort(path) for name, path in name_to_path_dict.items()}
+        io_binding = ort_session.io_binding()
+        io_binding.bind_cpu_input(input_name, input_nchw)
+        io_binding.bind_output(output_name, "cpu", 0, np.float32, output_shape, output_data.ctypes.data)
+        self._binding = (ort_session, io_binding, scaled_bgr, input_nchw, output_data)
         
-        return name_to_model_dict
+        return self._binding
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Functions
+
+def write_depth_input(frame_bgr, scaled_bgr_uint8, input_nchw_float32):
+    
+    '''
+    Helper used to convert a frame into the input format expected by depth-anything models, writing into
+    existing buffers. The frame is resized into the (HxWx3) scaled buffer and the result is written into
+    the (1x3xHxW) input buffer, which must match the scaled buffer sizing
+    '''
+    
+    # Image must be RGB ordered, with CxHxW shape, with normalized mean/standard deviation
+    # -> Done by resizing first, then converting each (flipped) BGR channel directly into the input buffer
+    scale_h, scale_w = scaled_bgr_uint8.shape[0:2]
+    cv2.resize(frame_bgr, dsize=(scale_w, scale_h), dst=scaled_bgr_uint8)
+    norm_scale, norm_offset = DepthDemo._norm_scale_rgb, DepthDemo._norm_offset_rgb
+    for ch_idx in range(3):
+        input_ch = input_nchw_float32[0, ch_idx]
+        np.multiply(scaled_bgr_uint8[:, :, 2 - ch_idx], norm_scale[ch_idx], out=input_ch, dtype=np.float32)
+        np.add(input_ch, norm_offset[ch_idx], out=input_ch)
+    
+    return input_nchw_float32
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import threading
+from time import perf_counter
+
+import numpy as np
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Classes
+
+class AsyncDepthRunner:
+    
+    '''
+    Wrapper around a DepthDemo, which runs depth inference on a separate thread at a (lower) target rate
+    Processing a frame only hands it off to the worker thread (if enough time has passed since the last
+    hand-off) and immediately returns the most recent depth map, so other models aren't held up by depth
+    Has the same interface as DepthDemo, so it can be used in place of it (or any model wrapping it)
+    '''
+    
+    def __init__(self, depth_demo, target_hz = 3.0):
+        
+        self._depth_demo = depth_demo
+        self._min_period_sec = 1.0 / target_hz
+        
+        # Storage for handing frames to/from the worker thread
+        self._cond = threading.Condition()
+        self._pending_frame = None
+        self._latest_depth = None
+        self._last_submit_time = -self._min_period_sec
+        self._worker_error = None
+        self._stop_event = threading.Event()
+        
+        # The depth model re-uses its buffers on every call, so only one thread can run it at a time
+        self._model_lock = threading.Lock()
+        self._worker = threading.Thread(target = self._run_worker, daemon = True)
+        self._worker.start()
+    
+    def get_model_names(self) -> list[str]:
+        return self._depth_demo.get_model_names()
+    
+    def set_model_select(self, model_select: str):
+        self._depth_demo.set_model_select(model_select)
+    
+    def process_frame(self, frame_bgr):
+        
+        '''
+        Hand off frame to the worker (if it's time for an update). Returns the latest depth map (or None)
+        Re-raises any error that stopped the worker thread
+        '''
+        
+        curr_time = perf_counter()
+        with self._cond:
+            if self._worker_error is not None:
+                raise self._worker_error
+            if (curr_time - self._last_submit_time) >= self._min_period_sec:
+                self._pending_frame = frame_bgr.copy()
+                self._last_submit_time = curr_time
+                self._cond.notify_all()
+            latest_depth = self._latest_depth
+        
+        return latest_depth
+    
+    def process_frames(self, frames_list) -> list:
+        
+        ''' Run depth on several frames directly (on the calling thread), waiting for the worker if it's busy '''
+        
+        with self._model_lock:
+            depth_results_list = self._depth_demo.process_frames(frames_list)
+        
+        return depth_results_list
+    
+    def draw_results(self, depth_result_1ch, display_shape, use_high_contrast = True):
+        
+        # Draw a blank frame until the first depth result is available
+        if depth_result_1ch is None:
+            return np.zeros(display_shape, dtype=np.uint8)
+        
+        # Depth map is resampled to match the current frame, even if the frame sizing changed since processing
+        return self._depth_demo.draw_results(depth_result_1ch, display_shape, use_high_contrast)
+    
+    def release(self):
+        
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._worker.join(timeout = 1.0)
+        
+        return
+    
+    def _run_worker(self):
+        
+        while not self._stop_event.is_set():
+            
+            # Wait for the next frame to process
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending_frame is not None or self._stop_event.is_set())
+                frame_bgr, self._pending_frame = self._pending_frame, None
+            if frame_bgr is None:
+                continue
+            
+            # Copy result, since the depth model re-uses its output buffer
+            # -> Errors stop the worker & are passed on to the next process_frame call
+            try:
+                with self._model_lock:
+                    depth_result = self._depth_demo.process_frame(frame_bgr).copy()
+            except Exception as err:
+                print("", "Error running depth model (on async thread):", str(err), sep="\n", flush=True)
+                with self._cond:
+                    self._worker_error = err
+                break
+            with self._cond:
+                self._latest_depth = depth_result
+        
+        return
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Functions
+
+def get_depth_proc_wh(frame_shape, max_side_px = 518, keep_aspect = False, patch_size_px = 14) -> tuple[int, int]:
+    
+    '''
+    Helper used to get a processing resolution for depth models, with a width & height that are multiples
+    of the model patch size. If keep_aspect is True, the longest side of the frame is scaled to (roughly) the
+    given max side length and the other side is scaled to match the frame aspect ratio,
+    otherwise a square size is used
+    Returns: proc_wh
+    '''
+    
+    to_patches = lambda side_px: max(1, round(side_px / patch_size_px)) * patch_size_px
+    if not keep_aspect:
+        return (to_patches(max_side_px), to_patches(max_side_px))
+    
+    frame_h, frame_w = frame_shape[0:2]
+    scale_factor = max_side_px / max(frame_h, frame_w)
+    
+    return (to_patches(frame_w * scale_factor), to_patches(frame_h * scale_factor))
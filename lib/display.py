@@ -29,9 +29,14 @@ class DisplayWindow:
         return self
     
     def imshow(self, display_frame):
-        
         cv2.imshow(self._name, display_frame)
-        keypress = cv2.waitKey(1) & 0xFF
+        return self.wait_key(1)
+    
+    def wait_key(self, wait_ms = 1):
+        
+        ''' Handle window events (without updating the displayed image). Returns: req_close, keypress '''
+        
+        keypress = cv2.waitKey(wait_ms) & 0xFF
         req_close = keypress in self._quit_keycodes
         
         return req_close, keypress
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import cv2
+import numpy as np
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Functions
+
+def track_keypoints(prev_gray, curr_gray, keypoints, min_confidence = 0.5):
+    
+    '''
+    Helper used to move keypoints from one frame to the next using (sparse) optical flow
+    Keypoints that can't be tracked are hidden by setting their confidence to 0
+    Returns: tracked_keypoints, tracked_ratio
+    where tracked_ratio is the fraction of visible keypoints that were tracked successfully
+    '''
+    
+    tracked_kpts = keypoints.copy()
+    is_visible = keypoints[:, :, 2] >= min_confidence
+    num_visible = np.count_nonzero(is_visible)
+    if num_visible == 0:
+        return tracked_kpts, 1.0
+    
+    # Track points both forward & backward, rejecting points that don't return to their starting point
+    # -> Optical flow needs a contiguous array of points, which slicing out the xy values doesn't give
+    prev_xys = np.ascontiguousarray(keypoints[is_visible][:, 0:2], dtype=np.float32).reshape(-1, 1, 2)
+    lk_config = {"winSize": (21, 21), "maxLevel": 3}
+    curr_xys, fwd_ok, _ = cv2.calcOpticalFlowPyrLK(prev_gray, curr_gray, prev_xys, None, **lk_config)
+    back_xys, back_ok, _ = cv2.calcOpticalFlowPyrLK(curr_gray, prev_gray, curr_xys, None, **lk_config)
+    back_error_px = np.linalg.norm((back_xys - prev_xys).reshape(-1, 2), axis=1)
+    is_tracked = (fwd_ok.ravel() == 1) & (back_ok.ravel() == 1) & (back_error_px < 1.0)
+    
+    # Update positions of tracked points & hide the rest
+    visible_kpts = tracked_kpts[is_visible]
+    visible_kpts[:, 0:2] = curr_xys.reshape(-1, 2)
+    visible_kpts[~is_tracked, 2] = 0.0
+    tracked_kpts[is_visible] = visible_kpts
+    
+    return tracked_kpts, np.count_nonzero(is_tracked) / num_visible
+
+def count_visible_keypoints(keypoints, min_confidence = 0.5) -> int:
+    return int(np.count_nonzero(keypoints[:, :, 2] >= min_confidence))
+
+def get_keypoints_box(person_keypoints, min_confidence = 0.5):
+    
+    ''' Helper used to get the bounding box (x1, y1, x2, y2) of the visible keypoints of a single person '''
+    
+    visible_xys = person_keypoints[person_keypoints[:, 2] >= min_confidence, 0:2]
+    if len(visible_xys) == 0:
+        return (0.0, 0.0, 0.0, 0.0)
+    (x1, y1), (x2, y2) = np.min(visible_xys, axis=0), np.max(visible_xys, axis=0)
+    
+    return (float(x1), float(y1), float(x2), float(y2))
+
+def get_box_iou(box_a, box_b) -> float:
+    
+    ''' Helper used to get the intersection-over-union of two boxes, given as (x1, y1, x2, y2) '''
+    
+    inter_w = max(0.0, min(box_a[2], box_b[2]) - max(box_a[0], box_b[0]))
+    inter_h = max(0.0, min(box_a[3], box_b[3]) - max(box_a[1], box_b[1]))
+    inter_area = inter_w * inter_h
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    union_area = area_a + area_b - inter_area
+    
+    return inter_area / union_area if union_area > 0 else 0.0
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import threading
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+# Typing
+from numpy import ndarray
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Classes
+
+class FrameRecord:
+    
+    '''
+    Holds a frame along with timing info about where it came from and what happened to it
+    The capture time (from perf_counter) comes from the frame reader, while later pipeline
+    stages (e.g. inference, drawing, display) are recorded by calling .stamp(...) as each one finishes
+    
+    Example usage:
+        
+        record = FrameRecord(frame, *vreader.get_capture_info())
+        results = model.process_frame(record.frame)
+        record.stamp("inference")
+        ...
+        record.stamp("display")
+        print(record.get_stage_latencies())
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, frame: ndarray, frame_index = -1, capture_time = None, decode_ms = 0.0):
+        self.frame = frame
+        self.frame_index = frame_index
+        self.capture_time = perf_counter() if capture_time is None else capture_time
+        self.decode_ms = decode_ms
+        self.stamps = {}
+    
+    # .................................................................................................................
+    
+    def stamp(self, stage_name: str):
+        self.stamps[stage_name] = perf_counter()
+        return self
+    
+    # .................................................................................................................
+    
+    def get_stage_latencies(self) -> dict[str, float]:
+        
+        '''
+        Get the time (in ms) taken by each stage, measured from the end of the previous stage
+        The first stage is measured from the capture time, so includes any time the frame spent
+        waiting to be read. Also includes entries for 'decode' and the 'total' (capture-to-last-stamp) time
+        '''
+        
+        stage_ms_dict = {"decode": self.decode_ms}
+        prev_time = self.capture_time
+        for stage_name, stage_time in self.stamps.items():
+            stage_ms_dict[stage_name] = 1000 * (stage_time - prev_time)
+            prev_time = stage_time
+        stage_ms_dict["total"] = 1000 * (prev_time - self.capture_time)
+        
+        return stage_ms_dict
+    
+    # .................................................................................................................
+
+
+class LatencyStats:
+    
+    '''
+    Helper used to collect per-stage latencies from recent frame records and report percentiles
+    Safe to use from multiple threads (e.g. adding records on one thread while reporting on another)
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, window_size = 300):
+        self._window_size = window_size
+        self._stage_ms_dict = {}
+        self._lock = threading.Lock()
+    
+    # .................................................................................................................
+    
+    def add_record(self, frame_record: FrameRecord):
+        
+        with self._lock:
+            for stage_name, stage_ms in frame_record.get_stage_latencies().items():
+                if stage_name not in self._stage_ms_dict:
+                    self._stage_ms_dict[stage_name] = deque(maxlen = self._window_size)
+                self._stage_ms_dict[stage_name].append(stage_ms)
+        
+        return self
+    
+    # .................................................................................................................
+    
+    def get_percentiles(self, stage_name: str, percentiles = (50, 95, 99)) -> tuple[float, ...]:
+        
+        ''' Get percentiles (in ms) of recent latencies for the given stage. Returns all zeros if there's no data '''
+        
+        with self._lock:
+            stage_ms = list(self._stage_ms_dict.get(stage_name, ()))
+        if not stage_ms:
+            return tuple(0.0 for _ in percentiles)
+        
+        return tuple(float(value) for value in np.percentile(stage_ms, percentiles))
+    
+    # .................................................................................................................
+    
+    def get_summary_lines(self, percentiles = (50, 95, 99)) -> list[str]:
+        
+        ''' Get one line of text per stage, listing latency percentiles (in ms) '''
+        
+        with self._lock:
+            stage_names_list = list(self._stage_ms_dict.keys())
+        name_pad = max((len(name) for name in stage_names_list), default = 0)
+        summary_lines = []
+        for stage_name in stage_names_list:
+            values = self.get_percentiles(stage_name, percentiles)
+            values_txt = "  ".join(f"p{pct}: {val:6.1f}" for pct, val in zip(percentiles, values))
+            summary_lines.append(f"{stage_name.rjust(name_pad)}  {values_txt} ms")
+        
+        return summary_lines
+    
+    # .................................................................................................................
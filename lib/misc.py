@@ -8,7 +8,9 @@
 import os
 import os.path as osp
 import json
-from collections import OrderedDict
+import threading
+from collections import OrderedDict, deque
+from time import perf_counter
 
 #---------------------------------------------------------------------------------------------------------------------
 #%% Classes
@@ -55,12 +57,158 @@ class SourceHistory:
         return self
 
 
+class FPSTracker:
+    
+    '''
+    Helper used to measure how often something happens (e.g. frames per second),
+    based on the timing of the most recent events
+    '''
+    
+    def __init__(self, window_sec = 2.0):
+        self._window_sec = window_sec
+        self._timestamps = deque()
+    
+    def tick(self):
+        
+        # Record new event, while dropping old events that are outside the measurement window
+        curr_time = perf_counter()
+        self._timestamps.append(curr_time)
+        while (curr_time - self._timestamps[0]) > self._window_sec:
+            self._timestamps.popleft()
+        
+        return self
+    
+    def get_fps(self) -> float:
+        
+        num_events = len(self._timestamps)
+        if num_events < 2:
+            return 0.0
+        
+        time_elapsed_sec = self._timestamps[-1] - self._timestamps[0]
+        
+        return (num_events - 1) / time_elapsed_sec if time_elapsed_sec > 0 else 0.0
+
+
+class ModelCache:
+    
+    '''
+    Helper used to load models only when they're first needed, while keeping the
+    (estimated) memory used by loaded models below a budget, by unloading the least recently used models
+    A single cache can be shared by different model types, as long as they use unique keys,
+    and can be used from multiple threads. Sizing can be given as a function, which is only called
+    when the model is loaded (i.e. not on every lookup)
+    
+    Example usage:
+        
+        cache = ModelCache(max_memory_mb = 1000)
+        model = cache.get(("pose", "yolov8n-pose"), lambda: load_model(path), size_mb = lambda: get_path_size_mb(path))
+    '''
+    
+    def __init__(self, max_memory_mb = None):
+        self._max_memory_mb = max_memory_mb
+        self._key_to_model_dict = OrderedDict()
+        self._key_to_size_dict = {}
+        self._key_to_load_lock_dict = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key, load_func, size_mb = 0.0):
+        
+        # Use already-loaded model if possible
+        with self._lock:
+            model = self._get_loaded(key)
+            if model is not None:
+                return model
+            load_lock = self._key_to_load_lock_dict.setdefault(key, threading.Lock())
+        
+        # Load outside of the main lock, so that slow loads don't hold up other models
+        # -> The per-key lock stops two threads from loading the same model at the same time
+        with load_lock:
+            with self._lock:
+                model = self._get_loaded(key)
+            if model is not None:
+                return model
+            
+            model = load_func()
+            size_mb = size_mb() if callable(size_mb) else size_mb
+            with self._lock:
+                self._key_to_model_dict[key] = model
+                self._key_to_size_dict[key] = size_mb
+                self._key_to_load_lock_dict.pop(key, None)
+                self._evict_to_budget()
+        
+        return model
+    
+    def get_memory_mb(self) -> float:
+        return sum(self._key_to_size_dict.values())
+    
+    def _get_loaded(self, key):
+        
+        # Returns None if the model isn't loaded. Must be called while holding the lock!
+        if key not in self._key_to_model_dict:
+            return None
+        self._key_to_model_dict.move_to_end(key)
+        
+        return self._key_to_model_dict[key]
+    
+    def _evict_to_budget(self):
+        
+        # Unload least recently used models (but always keep the newest one!) until we're within budget
+        if self._max_memory_mb is None:
+            return
+        while (self.get_memory_mb() > self._max_memory_mb) and (len(self._key_to_model_dict) > 1):
+            key, _ = self._key_to_model_dict.popitem(last = False)
+            self._key_to_size_dict.pop(key)
+            print(f"Unloaded model to save memory: {key}", flush = True)
+        
+        return
+
+
 # ---------------------------------------------------------------------------------------------------------------------
 #%% Functions
 
 def get_first_dict_item(dictionary: dict):
     return next(iter(dictionary.items()))
 
+def split_thread_budget(total_threads: int, weights_dict: dict) -> dict:
+    
+    '''
+    Helper used to split a total number of CPU threads between several users (e.g. models running at the
+    same time), in proportion to the given weights. Everyone gets at least 1 thread, so the total
+    must be at least the number of users. The split always adds up to exactly the total
+    Example:
+        split_thread_budget(8, {"depth": 2, "pose": 1, "aruco": 1})
+        -> {"depth": 4, "pose": 2, "aruco": 2}
+    '''
+    
+    assert total_threads >= len(weights_dict), "Thread budget must have at least 1 thread for every user!"
+    
+    # Give everyone 1 thread, then split the rest by weight
+    num_extra = total_threads - len(weights_dict)
+    total_weight = sum(weights_dict.values())
+    exact_dict = {key: num_extra * weight / total_weight for key, weight in weights_dict.items()}
+    split_dict = {key: 1 + int(exact) for key, exact in exact_dict.items()}
+    
+    # Hand out leftover threads to whoever was rounded down the most
+    num_leftover = total_threads - sum(split_dict.values())
+    by_remainder = sorted(exact_dict.keys(), key = lambda key: int(exact_dict[key]) - exact_dict[key])
+    for key in by_remainder[:num_leftover]:
+        split_dict[key] += 1
+    
+    return split_dict
+
+def get_path_size_mb(path) -> float:
+    
+    ''' Helper used to get the size of a file (or all files in a folder), in megabytes '''
+    
+    if not osp.isdir(path):
+        return osp.getsize(path) / 1e6
+    
+    total_bytes = 0
+    for parent_path, _, files_list in os.walk(path):
+        total_bytes += sum(osp.getsize(osp.join(parent_path, file)) for file in files_list)
+    
+    return total_bytes / 1e6
+
 def get_file_to_path_lut(folder_path, allowable_exts=None) -> dict:
     
     '''
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import signal
+import threading
+import traceback
+
+import numpy as np
+
+from lib.shared_frames import SharedFrameRing, get_fork_context
+
+# Typing
+from numpy import ndarray
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Classes
+
+class ModelProcess:
+    
+    '''
+    Wrapper around a model (e.g. PoseDemo, DepthDemo or ArucoDemo), which runs the model inside
+    of a separate (forked) worker process, so that model code which holds the GIL (e.g. post-processing)
+    doesn't hold up the main process or other models. Supports the same process/draw functions as the model
+    
+    Frames are passed to the worker through shared memory, rather than being pickled. Results are
+    expected to be 'compact' (e.g. arrays of keypoints or marker corners), and are sent back through a pipe,
+    except for results which are a single array (e.g. depth maps), which are returned through shared memory.
+    These arrays are copied out of shared memory, so (unlike the DepthDemo) results remain valid after
+    later frames are processed
+    
+    Drawing happens in the calling process, using the original model object. Models should be wrapped
+    before they're used, so that nothing (e.g. model weights or inference threads) is loaded prior to forking
+    
+    Example usage:
+        
+        pose_model = ModelProcess(PoseDemo())
+        results = pose_model.process_frame(frame)
+        frame = pose_model.draw_results(results, frame)
+        pose_model.release()
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, model, num_slots = 3, timeout_sec = None):
+        
+        # Forking is needed, so that the calling script doesn't re-run inside the worker process
+        mp_ctx = get_fork_context()
+        assert mp_ctx is not None, "Process-based models are not supported on this platform!"
+        
+        # Keep a local copy of the model for drawing, while the (forked) worker copy does the processing
+        # -> No timeout by default, since models may need to be downloaded or exported on first use
+        self._model = model
+        self._timeout_sec = timeout_sec
+        
+        # Set up shared memory for passing frames in & array results out, along with a pipe for everything else
+        self._in_ring = SharedFrameRing(num_slots, mp_ctx)
+        self._out_ring = SharedFrameRing(num_slots, mp_ctx)
+        self._conn, child_conn = mp_ctx.Pipe()
+        proc_args = (model, self._in_ring, self._out_ring, child_conn)
+        self._proc = mp_ctx.Process(target = _run_model_process, args = proc_args, daemon = True)
+        self._proc.start()
+        
+        # Requests can come from multiple threads (e.g. parallel inference), but the worker handles one at a time
+        self._lock = threading.Lock()
+        self._in_shape = None
+        self._out_shm_name = None
+        self._frame_count = 0
+        self._model_select = None
+    
+    # .................................................................................................................
+    
+    def get_model_names(self) -> list[str]:
+        return self._model.get_model_names()
+    
+    # .................................................................................................................
+    
+    def set_model_select(self, model_select: str):
+        
+        '''
+        Select a model variant. This is called on every frame, so rather than waiting on the worker
+        (which may be busy processing), the selection is sent along with the next frame to be processed
+        '''
+        
+        self._model.set_model_select(model_select)
+        self._model_select = model_select
+        
+        return self
+    
+    # .................................................................................................................
+    
+    def enable_tracking(self, *args, **kwargs):
+        return self.call_method("enable_tracking", *args, **kwargs)
+    
+    # .................................................................................................................
+    
+    def set_num_threads(self, num_threads: int):
+        return self.call_method("set_num_threads", num_threads)
+    
+    # .................................................................................................................
+    
+    def call_method(self, method_name: str, *args, **kwargs):
+        
+        ''' Call a (settings) method on the model held by the worker process. The return value is ignored '''
+        
+        self._request(("call", method_name, args, kwargs))
+        
+        return self
+    
+    # .................................................................................................................
+    
+    def process_frame(self, frame: ndarray):
+        
+        with self._lock:
+            
+            # Re-allocate shared memory if the frame shape changes, the worker attaches when told to
+            attach_info = None
+            if frame.shape != self._in_shape:
+                self._in_ring.close()
+                attach_info = (self._in_ring.allocate(frame.shape), frame.shape)
+                self._in_shape = frame.shape
+            
+            slot_idx, slot_frame = self._in_ring.claim_write_slot()
+            np.copyto(slot_frame, frame)
+            self._frame_count += 1
+            self._in_ring.publish(slot_idx, self._frame_count)
+            message = ("process", self._frame_count, attach_info, self._model_select)
+            results, out_info = self._request(message, use_lock = False)
+            
+            # Array results are held in shared memory, which the worker re-allocates if the result shape changes
+            if out_info is not None:
+                shm_name, out_shape, out_dtype, out_count = out_info
+                if shm_name != self._out_shm_name:
+                    self._out_ring.close()
+                    self._out_ring.attach(shm_name, out_shape, np.dtype(out_dtype))
+                    self._out_shm_name = shm_name
+                _, results, _ = self._out_ring.read_newest(out_count - 1, timeout_sec = 0)
+                results = results.copy()
+        
+        return results
+    
+    # .................................................................................................................
+    
+    def process_frames(self, frames_list) -> list:
+        
+        ''' Process several frames, one after the other (frames are not batched when running in a worker process) '''
+        
+        return [self.process_frame(frame) for frame in frames_list]
+    
+    # .................................................................................................................
+    
+    def draw_results(self, *args, **kwargs):
+        return self._model.draw_results(*args, **kwargs)
+    
+    # .................................................................................................................
+    
+    def release(self) -> None:
+        
+        try:
+            with self._lock:
+                self._conn.send(("stop",))
+        except (BrokenPipeError, OSError):
+            pass
+        self._proc.join(timeout = 2.0)
+        if self._proc.is_alive():
+            self._proc.terminate()
+        self._in_ring.close()
+        self._out_ring.close()
+        self._conn.close()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _request(self, message, use_lock = True):
+        
+        ''' Send a request to the worker & wait for the reply. Errors in the worker are re-raised here '''
+        
+        if use_lock:
+            with self._lock:
+                return self._request(message, use_lock = False)
+        
+        self._conn.send(message)
+        if not self._conn.poll(self._timeout_sec):
+            raise TimeoutError(f"No response from model process ({type(self._model).__name__})")
+        is_ok, reply = self._conn.recv()
+        if not is_ok:
+            raise RuntimeError(f"Error in model process ({type(self._model).__name__}):\n{reply}")
+        
+        return reply
+    
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Functions
+
+def _run_model_process(model, in_ring: SharedFrameRing, out_ring: SharedFrameRing, conn) -> None:
+    
+    '''
+    Function which runs inside of the worker process used by the ModelProcess
+    Handles requests from the parent process, one at a time, until told to stop
+    '''
+    
+    # Leave Ctrl+C handling to the parent, which shuts down workers on exit
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    out_key, out_shm_name = None, None
+    model_select = None
+    try:
+        while True:
+            
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message[0] == "stop":
+                break
+            
+            try:
+                if message[0] == "call":
+                    _, method_name, args, kwargs = message
+                    getattr(model, method_name)(*args, **kwargs)
+                    conn.send((True, None))
+                    continue
+                
+                # Attach to new frame memory if the parent re-allocated it & update the model selection
+                _, frame_count, attach_info, new_model_select = message
+                if attach_info is not None:
+                    in_ring.close()
+                    in_ring.attach(*attach_info)
+                if new_model_select is not None and new_model_select != model_select:
+                    model.set_model_select(new_model_select)
+                    model_select = new_model_select
+                _, frame, _ = in_ring.read_newest(frame_count - 1, timeout_sec = 0)
+                results = model.process_frame(frame)
+                
+                # Send back compact results directly, but pass single arrays through shared memory
+                if not isinstance(results, ndarray):
+                    conn.send((True, (results, None)))
+                    continue
+                
+                new_out_key = (results.shape, results.dtype.str)
+                if new_out_key != out_key:
+                    out_ring.close()
+                    out_shm_name = out_ring.allocate(results.shape, results.dtype)
+                    out_key = new_out_key
+                slot_idx, slot_array = out_ring.claim_write_slot()
+                np.copyto(slot_array, results)
+                out_ring.publish(slot_idx, frame_count)
+                conn.send((True, (None, (out_shm_name, *out_key, frame_count))))
+            
+            except Exception:
+                conn.send((False, traceback.format_exc()))
+    
+    finally:
+        in_ring.close()
+        out_ring.close()
+        conn.close()
+    
+    return
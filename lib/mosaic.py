@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+from math import ceil, sqrt
+
+import cv2
+import numpy as np
+
+from lib.misc import FPSTracker
+
+# Typing
+from numpy import ndarray
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Classes
+
+class StreamMosaic:
+    
+    '''
+    Class used to read from multiple video sources at once and combine them into a single (tiled) image
+    Works best with readers that capture on their own thread (e.g. ThreadedStreamReader), since
+    these can be checked for new frames without blocking. Other readers are read one frame at a time
+    
+    Example usage:
+        
+        mosaic = StreamMosaic([reader_1, reader_2, reader_3])
+        tile_wh = mosaic.get_tile_wh(max_side_px = 1000)
+        while True:
+            tiles_list = []
+            for is_new, frame in mosaic.read():
+                tile = cv2.resize(frame, dsize = tile_wh)
+                ...
+            mosaic_frame = mosaic.make_mosaic(tiles_list)
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, frame_readers: list, bg_color = (0,0,0), text_color = (255,255,255)):
+        
+        # Start up all readers (e.g. so capture threads begin filling up with frames)
+        self._readers = [iter(reader) for reader in frame_readers]
+        self._num_streams = len(self._readers)
+        self._fps_trackers = [FPSTracker() for _ in self._readers]
+        self._last_frames = [None] * self._num_streams
+        
+        # Lay out tiles in a grid that is as square as possible
+        self._num_rows, self._num_cols = get_grid_shape(self._num_streams)
+        
+        # Use first source to decide on tile sizing (all tiles are scaled to match)
+        self._base_tile_shape = frame_readers[0].get_shape()
+        
+        # Graphics
+        self._bg_color = bg_color
+        self._text_color = text_color
+    
+    # .................................................................................................................
+    
+    def __len__(self) -> int:
+        return self._num_streams
+    
+    # .................................................................................................................
+    
+    def get_shape(self) -> tuple[int,int,int]:
+        
+        ''' Returns the (full-sized) shape of the mosaic, mimicking other frame readers '''
+        
+        tile_h, tile_w = self._base_tile_shape[0:2]
+        
+        return (tile_h * self._num_rows, tile_w * self._num_cols, 3)
+    
+    # .................................................................................................................
+    
+    def get_tile_wh(self, max_side_px: int) -> tuple[int, int]:
+        
+        ''' Get the size of each tile, such that the full mosaic has the given maximum side length '''
+        
+        mosaic_h, mosaic_w = self.get_shape()[0:2]
+        tile_h, tile_w = self._base_tile_shape[0:2]
+        scale_factor = max_side_px / max(mosaic_h, mosaic_w)
+        
+        return (max(1, round(tile_w * scale_factor)), max(1, round(tile_h * scale_factor)))
+    
+    # .................................................................................................................
+    
+    def get_fps(self, stream_index: int) -> float:
+        return self._fps_trackers[stream_index].get_fps()
+    
+    # .................................................................................................................
+    
+    def get_num_dropped_frames(self) -> int:
+        
+        ''' Total number of frames that were captured but never read, for readers that keep track of this '''
+        
+        num_dropped = 0
+        for reader in self._readers:
+            try:
+                num_dropped += reader.get_num_dropped_frames()
+            except AttributeError:
+                pass
+        
+        return num_dropped
+    
+    # .................................................................................................................
+    
+    def read(self) -> list[tuple[bool, ndarray | None]]:
+        
+        '''
+        Read the newest frame from every stream
+        Returns a list of: (is_new_frame, frame) for each stream
+        Streams without new frames repeat their previous frame (which is None until a frame arrives)
+        '''
+        
+        results_list = []
+        for stream_idx, reader in enumerate(self._readers):
+            
+            # Avoid waiting on readers that can tell us if they have new frames
+            try:
+                is_new_frame, frame = reader.read_latest()
+            except AttributeError:
+                is_new_frame, frame = True, next(reader)
+            
+            if is_new_frame:
+                self._last_frames[stream_idx] = frame
+                self._fps_trackers[stream_idx].tick()
+            results_list.append((is_new_frame, self._last_frames[stream_idx]))
+        
+        return results_list
+    
+    # .................................................................................................................
+    
+    def make_mosaic(self, tile_frames: list[ndarray | None], tile_wh: tuple[int, int] | None = None) -> ndarray:
+        
+        '''
+        Combine (equally sized) tiles into a single image, with per-stream fps drawn onto each tile
+        Missing tiles (None) are drawn as blank tiles, sized to match the given tile size if provided,
+        otherwise sized from the first available tile (or the full source size, if there are no tiles)
+        '''
+        
+        # Figure out tile sizing
+        tile_shape = next((tile.shape for tile in tile_frames if tile is not None), None)
+        if tile_wh is not None:
+            tile_shape = (tile_wh[1], tile_wh[0], 3)
+        elif tile_shape is None:
+            tile_shape = self._base_tile_shape
+        blank_tile = np.full(tile_shape, self._bg_color, dtype = np.uint8)
+        
+        # Fill in grid row-by-row, padding with blank tiles as needed
+        num_grid_tiles = self._num_rows * self._num_cols
+        tiles_list = [blank_tile if tile is None else tile for tile in tile_frames]
+        tiles_list += [blank_tile] * (num_grid_tiles - len(tiles_list))
+        rows_list = [np.hstack(tiles_list[r*self._num_cols:(r+1)*self._num_cols]) for r in range(self._num_rows)]
+        mosaic_frame = np.vstack(rows_list)
+        
+        # Draw fps text onto the combined image (so that tiles themselves aren't modified)
+        tile_h, tile_w = tile_shape[0:2]
+        for stream_idx in range(self._num_streams):
+            row_idx, col_idx = divmod(stream_idx, self._num_cols)
+            self._draw_fps(stream_idx, mosaic_frame, (col_idx * tile_w, row_idx * tile_h))
+        
+        return mosaic_frame
+    
+    # .................................................................................................................
+    
+    def release(self) -> None:
+        for reader in self._readers:
+            reader.release()
+        return
+    
+    # .................................................................................................................
+    
+    def _draw_fps(self, stream_index: int, mosaic_frame: ndarray, tile_xy: tuple[int, int]) -> ndarray:
+        
+        '''
+        Helper used to draw the per-stream fps text onto a tile (with a background for better contrast)
+        Streams that are reconnecting are labeled as such, instead of showing the fps
+        '''
+        
+        fps_txt = f"{stream_index + 1}: {self.get_fps(stream_index):.1f} fps"
+        if self._readers[stream_index].is_reconnecting():
+            fps_txt = f"{stream_index + 1}: reconnecting..."
+        txt_xy = (tile_xy[0] + 5, tile_xy[1] + 20)
+        txt_config = {"fontFace": cv2.FONT_HERSHEY_SIMPLEX, "fontScale": 0.5, "lineType": cv2.LINE_AA}
+        cv2.putText(mosaic_frame, fps_txt, txt_xy, color = (0,0,0), thickness = 3, **txt_config)
+        cv2.putText(mosaic_frame, fps_txt, txt_xy, color = self._text_color, thickness = 1, **txt_config)
+        
+        return mosaic_frame
+    
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Functions
+
+def get_grid_shape(num_streams: int) -> tuple[int, int]:
+    
+    ''' Helper used to lay out mosaic tiles in a grid that is as square as possible. Returns: num_rows, num_cols '''
+    
+    num_cols = ceil(sqrt(num_streams))
+    num_rows = ceil(num_streams / num_cols)
+    
+    return num_rows, num_cols
+
+def get_tile_max_side(num_streams: int, frame_wh: tuple[int, int], max_side_px: int) -> int:
+    
+    '''
+    Helper used to get the largest side length of a mosaic tile, given the frame size of the (first) stream,
+    such that the full mosaic has the given maximum side length. This matches StreamMosaic.get_tile_wh,
+    but can be used before any readers are created (e.g. so readers can scale frames to the tile size)
+    '''
+    
+    num_rows, num_cols = get_grid_shape(num_streams)
+    frame_w, frame_h = frame_wh
+    scale_factor = max_side_px / max(frame_h * num_rows, frame_w * num_cols)
+    
+    return max(1, round(max(frame_w, frame_h) * scale_factor))
+
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import threading
+from collections import deque
+from time import perf_counter
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Classes
+
+class BoundedQueue:
+    
+    '''
+    Queue with a maximum size, used to pass items between pipeline stages
+    What happens when adding to a full queue depends on the drop mode:
+        "block" - wait for space (i.e. backpressure, slowing down whoever is adding items)
+        "drop_oldest" - throw away the oldest queued item, so the newest items are always kept
+        "drop_newest" - throw away the item being added, so queued items are always kept
+    '''
+    
+    valid_drop_modes = ("block", "drop_oldest", "drop_newest")
+    
+    # .................................................................................................................
+    
+    def __init__(self, max_size = 2, drop_mode = "block"):
+        
+        assert max_size >= 1, "Queue size must be at least 1!"
+        assert drop_mode in self.valid_drop_modes, f"Unknown drop mode: {drop_mode} ({self.valid_drop_modes})"
+        self._max_size = max_size
+        self._drop_mode = drop_mode
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._num_dropped = 0
+    
+    # .................................................................................................................
+    
+    def get_num_dropped(self) -> int:
+        return self._num_dropped
+    
+    # .................................................................................................................
+    
+    def put(self, item, stop_event: threading.Event, force = False) -> bool:
+        
+        '''
+        Add an item to the queue, following the drop mode if the queue is full
+        Forced items (e.g. end-of-stream markers) are always added, without dropping
+        Returns False if the stop event was set while waiting for space
+        '''
+        
+        with self._cond:
+            is_full = len(self._items) >= self._max_size
+            if is_full and not force:
+                if self._drop_mode == "drop_newest":
+                    self._num_dropped += 1
+                    return True
+                if self._drop_mode == "drop_oldest":
+                    self._items.popleft()
+                    self._num_dropped += 1
+                else:
+                    while len(self._items) >= self._max_size:
+                        if stop_event.is_set():
+                            return False
+                        self._cond.wait(timeout = 0.1)
+            self._items.append(item)
+            self._cond.notify_all()
+        
+        return True
+    
+    # .................................................................................................................
+    
+    def get(self, stop_event: threading.Event, timeout_sec = None):
+        
+        ''' Take the oldest item from the queue. Returns (False, None) if nothing arrives in time (or on stop) '''
+        
+        end_time = None if timeout_sec is None else perf_counter() + timeout_sec
+        with self._cond:
+            while len(self._items) == 0:
+                if stop_event.is_set():
+                    return False, None
+                wait_sec = 0.1 if end_time is None else min(0.1, end_time - perf_counter())
+                if wait_sec <= 0:
+                    return False, None
+                self._cond.wait(timeout = wait_sec)
+            item = self._items.popleft()
+            self._cond.notify_all()
+        
+        return True, item
+    
+    # .................................................................................................................
+
+
+class PipelineStage:
+    
+    '''
+    Describes one step of a FramePipeline: a function which takes in an item (from the previous stage)
+    and returns an item for the next stage, along with the sizing & drop mode of the queue feeding into it
+    (see BoundedQueue for drop modes)
+    '''
+    
+    def __init__(self, name: str, process_func, queue_size = 2, drop_mode = "block"):
+        self.name = name
+        self.process_func = process_func
+        self.input_queue = BoundedQueue(queue_size, drop_mode)
+
+
+class FramePipeline:
+    
+    '''
+    Runs a series of processing stages, each on its own thread, connected by bounded queues
+    A source function provides items (e.g. frames) to the first stage, while the output of the last stage
+    is collected on the calling thread using .get(). Since every stage runs at the same time, throughput
+    approaches the speed of the slowest stage, rather than the total time taken by all stages
+    
+    Stages should release the GIL for most of their work (as with OpenCV, onnxruntime and torch)
+    to see much of a speed up. The source function should raise StopIteration when it runs out of data
+    Errors raised by the source or any stage are re-raised when calling .get()
+    
+    Example usage:
+        
+        pipeline = FramePipeline(read_frame, [
+            PipelineStage("resize", resize_frame),
+            PipelineStage("inference", run_model),
+        ]).start()
+        while True:
+            output = pipeline.get()
+            if output is None: break
+            ...
+        pipeline.stop()
+    '''
+    
+    # Marks the end of the data stream
+    _end_of_stream = object()
+    
+    # .................................................................................................................
+    
+    def __init__(self, source_func, stages_list: list[PipelineStage], output_queue_size = 1,
+                 output_drop_mode = "block"):
+        
+        self._source_func = source_func
+        self._stages_list = stages_list
+        self._output_queue = BoundedQueue(output_queue_size, output_drop_mode)
+        self._stop_event = threading.Event()
+        self._threads_list = []
+    
+    # .................................................................................................................
+    
+    def start(self):
+        
+        # Each stage reads from its own queue and writes to the queue of the next stage (or the output)
+        queues_list = [stage.input_queue for stage in self._stages_list] + [self._output_queue]
+        self._threads_list = [threading.Thread(target = self._run_source, args = (queues_list[0],), daemon = True)]
+        for stage_idx, stage in enumerate(self._stages_list):
+            args = (stage, queues_list[stage_idx + 1])
+            self._threads_list.append(threading.Thread(target = self._run_stage, args = args, daemon = True))
+        
+        for thread in self._threads_list:
+            thread.start()
+        
+        return self
+    
+    # .................................................................................................................
+    
+    def get(self, timeout_sec = None):
+        
+        '''
+        Get the next output of the last stage. Returns None if the pipeline has finished (or times out)
+        Re-raises any error that occurred inside the pipeline
+        '''
+        
+        is_ok, item = self._output_queue.get(self._stop_event, timeout_sec)
+        if not is_ok or item is self._end_of_stream:
+            return None
+        if isinstance(item, _PipelineError):
+            raise item.error
+        
+        return item
+    
+    # .................................................................................................................
+    
+    def get_num_dropped(self) -> dict[str, int]:
+        
+        ''' Get the number of items dropped by the queue feeding into each stage '''
+        
+        return {stage.name: stage.input_queue.get_num_dropped() for stage in self._stages_list}
+    
+    # .................................................................................................................
+    
+    def stop(self, stage_timeout_sec = 1.0) -> None:
+        
+        '''
+        Stop all pipeline threads. Always waits for the source thread to finish (i.e. for any read
+        in progress to complete), so the source can be safely closed afterwards
+        '''
+        
+        self._stop_event.set()
+        for thread_idx, thread in enumerate(self._threads_list):
+            is_source_thread = (thread_idx == 0)
+            thread.join(timeout = None if is_source_thread else stage_timeout_sec)
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _run_source(self, out_queue: BoundedQueue) -> None:
+        
+        while not self._stop_event.is_set():
+            try:
+                item = self._source_func()
+            except StopIteration:
+                out_queue.put(self._end_of_stream, self._stop_event, force = True)
+                break
+            except Exception as err:
+                out_queue.put(_PipelineError(err), self._stop_event, force = True)
+                break
+            out_queue.put(item, self._stop_event)
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _run_stage(self, stage: PipelineStage, out_queue: BoundedQueue) -> None:
+        
+        while not self._stop_event.is_set():
+            
+            is_ok, item = stage.input_queue.get(self._stop_event)
+            if not is_ok:
+                continue
+            
+            # Pass along end-of-stream & errors without processing, so they reach the output
+            is_passthrough = (item is self._end_of_stream) or isinstance(item, _PipelineError)
+            if is_passthrough:
+                out_queue.put(item, self._stop_event, force = True)
+                break
+            
+            try:
+                item = stage.process_func(item)
+            except Exception as err:
+                out_queue.put(_PipelineError(err), self._stop_event, force = True)
+                break
+            out_queue.put(item, self._stop_event)
+        
+        return
+    
+    # .................................................................................................................
+
+
+class _PipelineError:
+    
+    ''' Wrapper used to pass errors through the pipeline, so they can be re-raised on the calling thread '''
+    
+    def __init__(self, error: Exception):
+        self.error = error
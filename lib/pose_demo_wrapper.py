@@ -5,10 +5,22 @@
 # ---------------------------------------------------------------------------------------------------------------------
 #%% Imports
 
+import os
+import os.path as osp
+import shutil
+import tempfile
+from glob import glob
+
+import cv2
+import numpy as np
+import onnxruntime
+import torch
 from ultralytics import YOLO
+from ultralytics.utils.plotting import Annotator
 
 from lib.downloading import download_missing_model_files
-from lib.misc import get_first_dict_item, get_file_to_path_lut
+from lib.keypoint_tracking import track_keypoints, count_visible_keypoints, get_keypoints_box, get_box_iou
+from lib.misc import ModelCache, get_first_dict_item, get_file_to_path_lut, get_path_size_mb
 
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -23,48 +35,328 @@ class PoseDemo:
         "https://github.com/ultralytics/assets/releases/download/v8.1.0/yolov8m-pose.pt",
     ]
     
-    def __init__(self, models_folder_path = "models/pose"):
+    # Supported inference backends, along with the (ultralytics) export format & file suffix of exported models
+    _backend_to_export_lut = {
+        "torch": None,
+        "onnx": ("onnx", ".onnx"),
+        "openvino": ("openvino", "_openvino_model"),
+    }
+    
+    def __init__(self, models_folder_path = "models/pose", backend = "torch", model_cache = None):
         
         # Get model files if needed
         download_missing_model_files(self._download_urls, models_folder_path)
         
-        self._name_to_model_dict = self._load_models(models_folder_path)
-        self._num_models = len(self._name_to_model_dict)
-        self._model_select, _ = get_first_dict_item(self._name_to_model_dict)
+        assert backend in self._backend_to_export_lut, f"Unknown pose backend: {backend}"
+        self._backend = backend
+        self._num_threads = None
+        
+        # Models are only loaded when first used
+        self._model_cache = ModelCache() if model_cache is None else model_cache
+        self._name_to_path_dict = get_file_to_path_lut(models_folder_path, allowable_exts = (".pt", ".pth"))
+        self._num_models = len(self._name_to_path_dict)
+        self._model_select, _ = get_first_dict_item(self._name_to_path_dict)
+        
+        # Tracking settings & state (disabled by default, see enable_tracking)
+        self._use_tracking = False
+        self._detect_interval = 5
+        self._min_tracked_ratio = 0.6
+        self._prev_gray = None
+        self._track_key = None
+        self._track_kpts = np.zeros((0, 17, 3), dtype=np.float32)
+        self._track_ids = np.zeros(0, dtype=np.int32)
+        self._next_track_id = 1
+        self._frames_since_detect = 0
+        self._num_detected_visible = 0
     
     def get_model_names(self) -> list[str]:
-        return list(self._name_to_model_dict.keys())
+        return list(self._name_to_path_dict.keys())
     
     def set_model_select(self, model_select_name: str):
         self._model_select = model_select_name
         return self
     
+    def set_num_threads(self, num_threads: int):
+        
+        '''
+        Limit the number of CPU threads used by pose models, e.g. when running alongside other models
+        For the torch backend, this sets the (process-wide) torch thread count. Exported (onnx/openvino)
+        models are given the thread limit when loaded, so this should be called before any models are used
+        '''
+        
+        self._num_threads = max(1, num_threads)
+        torch.set_num_threads(self._num_threads)
+        
+        return self
+    
+    def enable_tracking(self, enable = True, detect_interval = 5, min_tracked_ratio = 0.6):
+        
+        '''
+        When tracking is enabled, the pose model only runs every 'detect_interval' frames. In between,
+        keypoints are moved along using optical flow, which is much cheaper than running the model
+        The model also re-runs once fewer than 'min_tracked_ratio' of the keypoints visible at the last detection
+        are still being tracked
+        Each person is given an ID, which is kept as long as they're matched between detections
+        Note: Tracking assumes that all frames come from the same video source!
+        '''
+        
+        self._use_tracking = enable
+        self._detect_interval = detect_interval
+        self._min_tracked_ratio = min_tracked_ratio
+        self._prev_gray = None
+        self._track_key = None
+        
+        return self
+    
     def process_frame(self, frame):
         
-        model = self._name_to_model_dict[self._model_select]
-        pose_results = model(frame, verbose=False)
+        '''
+        Find people (and their keypoints) in a frame
+        Returns results as: (keypoints, person_ids)
+        where keypoints is an Nx17x3 array of (x, y, confidence) and person_ids is an
+        array of N ids if tracking is enabled, otherwise None
+        '''
         
-        return pose_results
+        if not self._use_tracking:
+            return (self._detect(frame), None)
+        
+        # Restart tracking if the model or frame sizing changes
+        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        track_key = (self._model_select, frame.shape)
+        need_detect = (track_key != self._track_key) or (self._frames_since_detect >= self._detect_interval)
+        
+        # Try moving keypoints along with the image content, falling back to detection if tracking is poor
+        # -> Losses are compared to the last detection, so that they can't build up a little at a time
+        if not need_detect:
+            tracked_kpts, _ = track_keypoints(self._prev_gray, frame_gray, self._track_kpts)
+            num_visible = count_visible_keypoints(tracked_kpts)
+            need_detect = num_visible < self._min_tracked_ratio * self._num_detected_visible
+        if need_detect:
+            tracked_kpts = self._detect(frame)
+            self._track_ids = self._match_track_ids(tracked_kpts)
+            self._num_detected_visible = count_visible_keypoints(tracked_kpts)
+            self._frames_since_detect = 0
+        else:
+            self._frames_since_detect += 1
+        
+        self._prev_gray = frame_gray
+        self._track_key = track_key
+        self._track_kpts = tracked_kpts
+        
+        return (tracked_kpts.copy(), self._track_ids.copy())
+    
+    def process_frames(self, frames_list, max_batch_size = 8) -> list:
+        
+        '''
+        Run the selected model on several frames at once (e.g. from multiple cameras, or a
+        short window of frames from a single camera), which is faster than processing frames one-by-one
+        Frames are processed in batches of (up to) max_batch_size. Tracking isn't used here
+        Returns a list of results, one per frame, each of which can be given to draw_results
+        '''
+        
+        model = self._get_selected_model()
+        
+        pose_results_list = []
+        for batch_idx in range(0, len(frames_list), max_batch_size):
+            batch_frames = frames_list[batch_idx:(batch_idx + max_batch_size)]
+            batch_results = model(batch_frames, verbose=False)
+            pose_results_list.extend((get_keypoints_array(result), None) for result in batch_results)
+        
+        return pose_results_list
     
     def draw_results(self, results, display_frame):
         
-        for result in results:
-            # boxes = result.boxes
-            # keypoints = result.keypoints
-            display_frame = result.plot(boxes = False, img=display_frame)
+        # Draw skeletons the same way as yolo (i.e. as with result.plot(...))
+        keypoints, person_ids = results
+        annotator = Annotator(display_frame)
+        for person_kpts in reversed(keypoints):
+            annotator.kpts(person_kpts, display_frame.shape[0:2], radius = 5, kpt_line = True)
+        display_frame = annotator.result()
+        
+        # Label each person with their ID (if tracking), above their highest visible keypoint
+        if person_ids is not None:
+            txt_config = {"fontFace": cv2.FONT_HERSHEY_SIMPLEX, "fontScale": 0.5, "lineType": cv2.LINE_AA}
+            for person_kpts, person_id in zip(keypoints, person_ids):
+                visible_xys = person_kpts[person_kpts[:, 2] >= 0.5, 0:2]
+                if len(visible_xys) == 0:
+                    continue
+                top_idx = np.argmin(visible_xys[:, 1])
+                txt_xy = (int(visible_xys[top_idx, 0]), max(15, int(visible_xys[top_idx, 1]) - 15))
+                cv2.putText(display_frame, f"ID: {person_id}", txt_xy, color=(0,0,0), thickness=3, **txt_config)
+                cv2.putText(display_frame, f"ID: {person_id}", txt_xy, color=(255,255,255), thickness=1, **txt_config)
         
         return display_frame
     
-    def _load_models(self, folder_path) -> dict:
+    def _detect(self, frame):
+        
+        ''' Helper used to run the selected model on a frame. Returns an Nx17x3 keypoints array '''
+        
+        model = self._get_selected_model()
+        pose_results = model(frame, verbose=False)
+        
+        return get_keypoints_array(pose_results[0])
+    
+    def _match_track_ids(self, new_kpts):
+        
+        '''
+        Helper used to assign IDs to newly detected people, by (greedily) matching them to previously
+        tracked people based on the overlap of their keypoint bounding boxes. Unmatched people get new IDs
+        Returns an array of IDs, one for each person in the given keypoints
+        '''
+        
+        # Find overlap between every pair of new/previous people
+        new_boxes = [get_keypoints_box(person_kpts) for person_kpts in new_kpts]
+        prev_boxes = [get_keypoints_box(person_kpts) for person_kpts in self._track_kpts]
+        pairs_list = []
+        for new_idx, new_box in enumerate(new_boxes):
+            for prev_idx, prev_box in enumerate(prev_boxes):
+                iou = get_box_iou(new_box, prev_box)
+                if iou > 0.3:
+                    pairs_list.append((iou, new_idx, prev_idx))
+        
+        # Keep best matches first
+        new_ids = np.full(len(new_kpts), -1, dtype=np.int32)
+        used_prev_idxs = set()
+        for _, new_idx, prev_idx in sorted(pairs_list, reverse = True):
+            if new_ids[new_idx] < 0 and prev_idx not in used_prev_idxs:
+                new_ids[new_idx] = self._track_ids[prev_idx]
+                used_prev_idxs.add(prev_idx)
+        
+        # Give new IDs to anyone left over
+        for new_idx in np.flatnonzero(new_ids < 0):
+            new_ids[new_idx] = self._next_track_id
+            self._next_track_id += 1
+        
+        return new_ids
+    
+    def _get_selected_model(self):
+        
+        ''' Helper used to get the selected yolo model, which is loaded on first use '''
+        
+        model_path = self._name_to_path_dict[self._model_select]
+        load_func = lambda: self._load_model(model_path)
+        
+        # Size the model file that was actually loaded (sizing happens after loading, so exports will exist)
+        size_func = lambda: get_path_size_mb(self._get_loadable_path(model_path))
+        
+        return self._model_cache.get(("pose", self._model_select), load_func, size_func)
+    
+    def _get_loadable_path(self, model_path):
         
         '''
-        Helper which loads multiple yolo models, smallest first
-        Returns a dictionary whose keys are the model names (no file extension) and
-        have corresponding values of the models themselves
+        Helper used to get the path of the model file used by the selected backend, which is the exported
+        copy of the model for non-torch backends (if it exists), otherwise the original model file
         '''
         
-        # Get listing of yolo model files available
-        name_to_paths_dict = get_file_to_path_lut(folder_path, allowable_exts = (".pt", ".pth"))
-        name_to_model_dict = {name: YOLO(path).to("cpu") for name, path in name_to_paths_dict.items()}
+        export_config = self._backend_to_export_lut[self._backend]
+        if export_config is None:
+            return model_path
+        
+        _, export_suffix = export_config
+        exported_path = osp.splitext(model_path)[0] + export_suffix
+        
+        return exported_path if osp.exists(exported_path) else model_path
+    
+    def _load_model(self, model_path):
+        
+        '''
+        Helper which loads a single yolo model using the selected backend
+        For non-torch backends, the model is exported on first use and saved next
+        to the original model file (e.g. yolov8n-pose.onnx), so later runs can skip exporting
+        Falls back to using torch if the export fails
+        '''
+        
+        export_config = self._backend_to_export_lut[self._backend]
+        if export_config is None:
+            return YOLO(model_path).to("cpu")
+        
+        # Export model if we haven't already
+        export_format, export_suffix = export_config
+        exported_path = osp.splitext(model_path)[0] + export_suffix
+        if not osp.exists(exported_path):
+            print("", f"Exporting pose model ({export_format}): {osp.basename(model_path)}", sep="\n", flush=True)
+            try:
+                exported_path = self._export_model(model_path, export_format, exported_path)
+            except Exception as err:
+                print("", "Error exporting pose model, will use torch instead!", str(err), sep="\n", flush=True)
+                return YOLO(model_path).to("cpu")
+        
+        yolo_model = YOLO(exported_path, task = "pose")
+        if self._num_threads is not None:
+            yolo_model = self._limit_backend_threads(yolo_model, exported_path)
+        
+        return yolo_model
+    
+    def _export_model(self, model_path, export_format, exported_path):
         
-        return name_to_model_dict
+        '''
+        Helper used to export a model to a different backend format. Exporting happens in a temporary folder,
+        so that partial results (e.g. from a failed or interrupted export) are never mistaken for a finished
+        export on later runs. The exported model is only moved to its final path once exporting succeeds
+        '''
+        
+        temp_folder_path = tempfile.mkdtemp(prefix = "export_", dir = osp.dirname(model_path))
+        try:
+            temp_model_path = osp.join(temp_folder_path, osp.basename(model_path))
+            shutil.copy2(model_path, temp_model_path)
+            
+            # Dynamic shapes are needed to support batched inference (see process_frames)
+            temp_exported_path = YOLO(temp_model_path).export(format = export_format, dynamic = True, verbose = False)
+            os.replace(osp.normpath(temp_exported_path), exported_path)
+        
+        finally:
+            shutil.rmtree(temp_folder_path, ignore_errors = True)
+        
+        return exported_path
+    
+    def _limit_backend_threads(self, yolo_model, exported_path):
+        
+        '''
+        Helper used to limit the number of CPU threads used by an exported (onnx or openvino) model
+        Ultralytics doesn't expose thread settings for these backends, so the model is run once
+        (which sets up the inference backend) and the backend session is then re-created with a thread limit
+        If this fails, the model is left as-is (using all cores)
+        '''
+        
+        yolo_model(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+        backend = yolo_model.predictor.model
+        try:
+            if self._backend == "onnx":
+                sess_options = onnxruntime.SessionOptions()
+                sess_options.intra_op_num_threads = self._num_threads
+                providers = ["CPUExecutionProvider"]
+                backend.session = onnxruntime.InferenceSession(exported_path, sess_options, providers=providers)
+            
+            elif self._backend == "openvino":
+                import openvino as ov
+                ov_core = ov.Core()
+                ov_model = ov_core.read_model(glob(osp.join(exported_path, "*.xml"))[0])
+                if ov_model.get_parameters()[0].get_layout().empty:
+                    ov_model.get_parameters()[0].set_layout(ov.Layout("NCHW"))
+                ov_config = {"PERFORMANCE_HINT": "LATENCY", "INFERENCE_NUM_THREADS": self._num_threads}
+                backend.ov_compiled_model = ov_core.compile_model(ov_model, "CPU", ov_config)
+        
+        except Exception as err:
+            print("", "Unable to limit threads used by pose model!", str(err), sep="\n", flush=True)
+        
+        return yolo_model
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Functions
+
+def get_keypoints_array(yolo_result):
+    
+    '''
+    Helper used to get keypoints from a yolo (pose) result as an Nx17x3 array of (x, y, confidence)
+    Models that don't output keypoint confidence are given a confidence of 1
+    '''
+    
+    if yolo_result.keypoints is None:
+        return np.zeros((0, 17, 3), dtype=np.float32)
+    
+    keypoints = np.float32(yolo_result.keypoints.data.cpu().numpy())
+    if keypoints.shape[2] == 2:
+        keypoints = np.concatenate((keypoints, np.ones_like(keypoints[:, :, 0:1])), axis=2)
+    
+    return keypoints
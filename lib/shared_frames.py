@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import os
+import sys
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+# Typing
+from numpy import ndarray
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Classes
+
+class SharedFrameRing:
+    
+    '''
+    Ring of preallocated frame 'slots' held in shared memory, used to pass frames between processes
+    One process writes frames into the ring while another reads them, without any pickling/copying.
+    The newest frame is always readable and slots are handed out so that the writer never
+    overwrites the slot currently held by the reader.
+    
+    The sync primitives are created on init, so this object must be given to child processes
+    when they're started (e.g. as an argument to mp.Process). The shared memory itself is
+    allocated later, once the frame shape is known (see allocate & attach)
+    
+    Example usage:
+        
+        # In parent process
+        ring = SharedFrameRing(num_slots = 3, mp_context = ctx)
+        proc = ctx.Process(target = writer_func, args = (ring, ...))
+        shm_name = ring.allocate(frame_shape)
+        
+        # In child process
+        ring.attach(shm_name, frame_shape)
+        slot_idx, slot_frame = ring.claim_write_slot()
+        slot_frame[:] = ...
+        ring.publish(slot_idx, frame_count)
+        
+        # Back in the parent
+        frame_count, frame, frame_timing = ring.read_newest(last_frame_count)
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, num_slots = 3, mp_context = None):
+        
+        # Need at least 3 slots: one being read, one holding the newest frame & one to write into
+        assert num_slots >= 3, "Shared frame ring needs at least 3 slots!"
+        self._num_slots = num_slots
+        
+        # Set up shared book-keeping, which must exist before child processes are started
+        ctx = mp if mp_context is None else mp_context
+        self._cond = ctx.Condition()
+        self._slot_counts = ctx.RawArray("q", num_slots)
+        self._slot_timings = ctx.RawArray("d", 2 * num_slots)
+        self._latest_slot = ctx.RawValue("i", -1)
+        self._read_slot = ctx.RawValue("i", -1)
+        self._is_closed = ctx.RawValue("b", 0)
+        
+        # Start the resource tracker (which cleans up leaked shared memory) before any child processes,
+        # so that children share it with this process rather than starting their own (see attach)
+        if os.name == "posix":
+            resource_tracker.ensure_running()
+        
+        # Process-local storage, set up on allocate/attach
+        self._shm = None
+        self._slots = []
+        self._is_owner = False
+        self._write_slot = -1
+    
+    # .................................................................................................................
+    
+    def __getstate__(self):
+        
+        ''' Only the sync primitives are given to other processes, shared memory must be attached separately '''
+        
+        state = self.__dict__.copy()
+        state.update({"_shm": None, "_slots": [], "_is_owner": False, "_write_slot": -1})
+        
+        return state
+    
+    # .................................................................................................................
+    
+    def allocate(self, frame_shape: tuple[int, ...], dtype = np.uint8) -> str:
+        
+        ''' Allocate shared memory for all frame slots. Returns the name needed to attach to the memory '''
+        
+        slot_nbytes = int(np.prod(frame_shape)) * np.dtype(dtype).itemsize
+        self._shm = shared_memory.SharedMemory(create = True, size = slot_nbytes * self._num_slots)
+        self._is_owner = True
+        self._slots = self._make_slot_views(frame_shape, dtype)
+        
+        return self._shm.name
+    
+    # .................................................................................................................
+    
+    def attach(self, shm_name: str, frame_shape: tuple[int, ...], dtype = np.uint8):
+        
+        ''' Attach to shared memory that was allocated by another process '''
+        
+        # The owner (who called allocate) is responsible for clean up, so attaching shouldn't be tracked
+        # -> Before python 3.13, attaching always registers with the resource tracker. This is shared with
+        #    the owner (see __init__) & tracks names as a set, so registering again is harmless, but the
+        #    memory must not be unregistered here, since that would also remove the registration of the owner
+        if sys.version_info >= (3, 13):
+            self._shm = shared_memory.SharedMemory(name = shm_name, track = False)
+        else:
+            self._shm = shared_memory.SharedMemory(name = shm_name)
+        self._is_owner = False
+        self._slots = self._make_slot_views(frame_shape, dtype)
+        
+        return self
+    
+    # .................................................................................................................
+    
+    def claim_write_slot(self) -> tuple[int, ndarray]:
+        
+        '''
+        Get a slot that can be written into, without interfering with the reader
+        Returns slot_index, slot_frame (a writeable view into shared memory)
+        '''
+        
+        with self._cond:
+            busy_slots = (self._latest_slot.value, self._read_slot.value)
+            for offset in range(1, self._num_slots + 1):
+                slot_idx = (self._write_slot + offset) % self._num_slots
+                if slot_idx not in busy_slots:
+                    break
+            self._write_slot = slot_idx
+        
+        return slot_idx, self._slots[slot_idx]
+    
+    # .................................................................................................................
+    
+    def publish(self, slot_index: int, frame_count: int, capture_time = 0.0, decode_ms = 0.0) -> None:
+        
+        '''
+        Mark a (written) slot as holding the newest frame and wake up any waiting readers
+        Timing info (capture_time from perf_counter & decode_ms) can be included, which is passed on to readers
+        '''
+        
+        with self._cond:
+            self._slot_counts[slot_index] = frame_count
+            self._slot_timings[2 * slot_index] = capture_time
+            self._slot_timings[2 * slot_index + 1] = decode_ms
+            self._latest_slot.value = slot_index
+            self._cond.notify_all()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def read_newest(self, last_frame_count: int, timeout_sec = None) -> tuple[int, ndarray | None, tuple]:
+        
+        '''
+        Wait for a frame newer than the given count and return it
+        Returns frame_count, frame, (capture_time, decode_ms)
+        
+        The frame is a read-only view into shared memory, which remains valid
+        only until the next call to this function!
+        If no new frame arrives in time (or the writer closed the ring),
+        the returned frame will be None
+        '''
+        
+        with self._cond:
+            self._cond.wait_for(lambda: self._is_new(last_frame_count), timeout_sec)
+            if not self._is_new(last_frame_count, include_closed = False):
+                return last_frame_count, None, (0.0, 0.0)
+            
+            # Claim the newest slot, so the writer leaves it alone
+            slot_idx = self._latest_slot.value
+            self._read_slot.value = slot_idx
+            frame_count = self._slot_counts[slot_idx]
+            frame_timing = (self._slot_timings[2 * slot_idx], self._slot_timings[2 * slot_idx + 1])
+        
+        frame = self._slots[slot_idx].view()
+        frame.flags.writeable = False
+        
+        return frame_count, frame, frame_timing
+    
+    # .................................................................................................................
+    
+    def mark_closed(self) -> None:
+        
+        ''' Used by the writer to signal that no more frames are coming '''
+        
+        with self._cond:
+            self._is_closed.value = 1
+            self._cond.notify_all()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def is_closed(self) -> bool:
+        return bool(self._is_closed.value)
+    
+    # .................................................................................................................
+    
+    def close(self) -> None:
+        
+        ''' Release access to shared memory. The owner also frees the memory itself '''
+        
+        if self._shm is None:
+            return
+        
+        # Views must be released before the memory can be closed
+        # -> If frames are still being held elsewhere, the memory is freed once they're gone
+        self._slots = []
+        try:
+            self._shm.close()
+        except BufferError:
+            pass
+        if self._is_owner:
+            self._shm.unlink()
+        self._shm = None
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _is_new(self, last_frame_count, include_closed = True) -> bool:
+        
+        slot_idx = self._latest_slot.value
+        is_new = (slot_idx >= 0) and (self._slot_counts[slot_idx] > last_frame_count)
+        if include_closed:
+            is_new = is_new or self.is_closed()
+        
+        return is_new
+    
+    # .................................................................................................................
+    
+    def _make_slot_views(self, frame_shape, dtype) -> list[ndarray]:
+        
+        all_slots = np.ndarray((self._num_slots, *frame_shape), dtype = dtype, buffer = self._shm.buf)
+        
+        return [all_slots[idx] for idx in range(self._num_slots)]
+    
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Functions
+
+def get_fork_context():
+    
+    '''
+    Helper used to get a 'fork' multiprocessing context, if the platform supports it
+    Forking avoids re-running the calling script inside child processes (which is what
+    happens with 'spawn', unless the script is wrapped in an 'if __name__ == "__main__"' block)
+    Returns None if forking isn't available (e.g. on Windows)
+    '''
+    
+    if "fork" not in mp.get_all_start_methods():
+        return None
+    
+    return mp.get_context("fork")
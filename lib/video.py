@@ -5,10 +5,25 @@
 # ---------------------------------------------------------------------------------------------------------------------
 #%% Imports
 
+import os
 import os.path as osp
+import re
+import json
+import queue
+import shutil
+import subprocess
+import threading
+from bisect import bisect_right
+from math import ceil
+from glob import glob
+from collections import deque, OrderedDict
+from time import perf_counter
+
 import cv2
 import numpy as np
-from time import perf_counter
+
+from lib.shared_frames import SharedFrameRing, get_fork_context
+from lib.misc import FPSTracker
 
 # Typing
 from typing import Protocol
@@ -20,7 +35,11 @@ from numpy import ndarray
 
 class FrameReader(Protocol):
     
-    ''' Defines standard interface for all types of frame-by-frame readers (e.g rtsp/webcam/files) '''
+    '''
+    Defines standard interface for all types of frame-by-frame readers (e.g rtsp/webcam/files)
+    The capture info describes the most recently read frame: (frame_index, capture_time, decode_ms)
+    where capture_time comes from perf_counter() and decode_ms is 0 if decoding isn't timed
+    '''
     
     def __iter__(self): ...
     def __next__(self) -> ndarray | None: ...
@@ -28,28 +47,157 @@ class FrameReader(Protocol):
     def read(self) -> tuple[bool, ndarray | None]: ...
     def release(self) -> None: ...
     def exhaust_buffered_frames(self, max_frames_to_exhaust: int) -> None: ...
+    def is_reconnecting(self) -> bool: return False
+    def get_capture_info(self) -> tuple[int, float, float]: return (-1, perf_counter(), 0.0)
+
+
+class ReconnectBackoff:
+    
+    '''
+    Helper used to space out attempts at reconnecting to a video source,
+    waiting (exponentially) longer after each failed attempt
+    '''
+    
+    def __init__(self, initial_delay_sec = 0.5, max_delay_sec = 30.0):
+        self._initial_delay_sec = initial_delay_sec
+        self._max_delay_sec = max_delay_sec
+        self._next_delay_sec = initial_delay_sec
+    
+    def reset(self):
+        self._next_delay_sec = self._initial_delay_sec
+        return self
+    
+    def wait(self, stop_event) -> bool:
+        
+        ''' Wait before the next attempt. Returns False if the stop event is set while waiting '''
+        
+        is_stopped = stop_event.wait(self._next_delay_sec)
+        self._next_delay_sec = min(self._max_delay_sec, 2 * self._next_delay_sec)
+        
+        return not is_stopped
+
+
+class AdaptiveDropPolicy:
+    
+    '''
+    Helper used to decide how many frames a (synchronous) stream reader should skip over,
+    based on how long the caller spends processing each frame compared to how often frames arrive
+    Available modes:
+        "auto" - pick one of the modes below, based on the measured timing
+        "all" - keep every frame (this will lag behind the stream if processing is too slow!)
+        "nth" - keep every Nth frame, with N chosen so that processing keeps up with the stream
+        "newest" - skip over all buffered frames, always using the newest one
+    '''
+    
+    valid_modes = ("auto", "all", "nth", "newest")
+    
+    def __init__(self, mode = "auto", reported_fps = 0.0, max_nth = 4, smoothing_factor = 0.1):
+        
+        assert mode in self.valid_modes, f"Unknown drop policy: {mode} (must be one of {self.valid_modes})"
+        self._mode = mode
+        self._max_nth = max_nth
+        self._smoothing_factor = smoothing_factor
+        
+        # Cameras may report 0 fps, in which case we start from a typical frame rate until we measure the real one
+        self._frame_period_ms = (1000.0 / reported_fps) if reported_fps > 0 else (1000.0 / 30.0)
+        self._processing_ms = 0.0
+        self._last_read_end_time = None
+        
+        self._active_mode = "all"
+        self._keep_every_nth = 1
+        self._fps_tracker = FPSTracker()
+    
+    def get_frame_period_ms(self) -> float:
+        return self._frame_period_ms
+    
+    def get_processed_fps(self) -> float:
+        return self._fps_tracker.get_fps()
+    
+    def get_active_mode(self) -> str:
+        return f"every {self._keep_every_nth}" if self._active_mode == "nth" else self._active_mode
+    
+    def add_frame_period(self, frame_period_ms: float):
+        
+        ''' Update the (smoothed) time between frames arriving from the source. Ignores unrealistic values '''
+        
+        if 1.0 < frame_period_ms < 1000.0:
+            self._frame_period_ms += self._smoothing_factor * (frame_period_ms - self._frame_period_ms)
+        
+        return self
+    
+    def start_read(self) -> int | None:
+        
+        '''
+        Should be called at the start of every read, to measure how long the caller spent on the previous frame
+        Returns the number of frames to skip before using the next frame, or None to skip to the newest frame
+        '''
+        
+        if self._last_read_end_time is not None:
+            processing_ms = 1000 * (perf_counter() - self._last_read_end_time)
+            self._processing_ms += self._smoothing_factor * (processing_ms - self._processing_ms)
+        
+        # Keep enough frames to match our processing rate. Fall back to skipping to the newest frame if we're far behind
+        self._keep_every_nth = max(1, ceil(self._processing_ms / self._frame_period_ms))
+        self._active_mode = self._mode
+        if self._mode == "auto":
+            self._active_mode = "all" if self._keep_every_nth == 1 else "nth"
+            if self._keep_every_nth > self._max_nth:
+                self._active_mode = "newest"
+        
+        if self._active_mode == "all":
+            return 0
+        if self._active_mode == "nth":
+            return self._keep_every_nth - 1
+        return None
+    
+    def end_read(self, read_ok: bool):
+        self._last_read_end_time = perf_counter()
+        if read_ok:
+            self._fps_tracker.tick()
+        return self
 
 
 class VideoStreamReader(FrameReader):
     
     '''
     Class for reading from 'streaming' video sources (e.g. rtsp or webcams)
-    Includes support for skipping frames that read too slowly
+    Includes support for skipping frames when the caller can't keep up with the stream,
+    based on the given drop mode (see AdaptiveDropPolicy)
+    
+    If the source disconnects, reconnecting is handled on a background thread, while
+    the last good frame continues to be returned (see is_reconnecting)
     '''
     
     # .................................................................................................................
     
-    def __init__(self, video_source: str | int, min_read_time_ms = 10):
+    def __init__(self, video_source: str | int, drop_mode = "auto",
+                 reconnect_delay_sec = 0.5, max_reconnect_delay_sec = 30.0):
         
         self._source = video_source
-        self._min_read_time_ms = min_read_time_ms
         self.cap = cv2.VideoCapture(self._source)
         if not self.cap.isOpened():
             raise SystemExit("Unable to open video source!")
         
+        # Set up frame skipping, which adapts to the real arrival rate of frames
+        self._drop_policy = AdaptiveDropPolicy(drop_mode, self.cap.get(cv2.CAP_PROP_FPS))
+        self._prev_stream_time_ms = None
+        self._prev_waited_grab_time = None
+        self._num_dropped = 0
+        
         frame_w = int(round(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
         frame_h = int(round(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
         self._shape = (frame_h, frame_w, 3)
+        
+        # Storage for reconnecting, which happens on a separate thread
+        self._backoff = ReconnectBackoff(reconnect_delay_sec, max_reconnect_delay_sec)
+        self._reconnect_thread = None
+        self._reconnect_poll_sec = 0.05
+        self._stop_event = threading.Event()
+        self._last_frame = None
+        
+        # Timing info about the most recently read frame
+        self._grab_count = 0
+        self._capture_info = (-1, perf_counter(), 0.0)
     
     # .................................................................................................................
     
@@ -76,13 +224,21 @@ class VideoStreamReader(FrameReader):
         Note: This allows instances of this class to be used in for loops
         '''
         
-        # Read next frame, or loop back to beginning if there are no more frames
+        # Keep serving the last good frame while reconnecting
+        # -> Wait briefly (or until reconnected) first, so callers don't spin re-processing the same frame
+        if self.is_reconnecting():
+            self._reconnect_thread.join(timeout = self._reconnect_poll_sec)
+            if self.is_reconnecting():
+                return self._last_frame
+        
+        # Start reconnecting if reading fails
         read_ok, frame_bgr = self.read()
         if not read_ok:
-            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            read_ok, frame_bgr = self.read()
-            if not read_ok: raise IOError("Error reading frames! Disconnected?")
+            if self._last_frame is None: raise IOError("Error reading frames! Disconnected?")
+            self._start_reconnect()
+            return self._last_frame
         
+        self._last_frame = frame_bgr
         return frame_bgr
     
     # .................................................................................................................
@@ -97,23 +253,67 @@ class VideoStreamReader(FrameReader):
     
     # .................................................................................................................
     
+    def is_reconnecting(self) -> bool:
+        return self._reconnect_thread is not None and self._reconnect_thread.is_alive()
+    
+    # .................................................................................................................
+    
+    def get_capture_info(self) -> tuple[int, float, float]:
+        return self._capture_info
+    
+    # .................................................................................................................
+    
+    def get_num_dropped_frames(self) -> int:
+        return self._num_dropped
+    
+    # .................................................................................................................
+    
+    def get_processed_fps(self) -> float:
+        return self._drop_policy.get_processed_fps()
+    
+    # .................................................................................................................
+    
+    def get_drop_mode(self) -> str:
+        return self._drop_policy.get_active_mode()
+    
+    # .................................................................................................................
+    
     def read(self) -> tuple[bool, ndarray | None]:
         
-        ''' Read frames from video, with frame skipping if read happens too fast '''
+        '''
+        Read frames from video, skipping frames if the caller isn't keeping up with the stream
+        How many frames are skipped is decided by the drop policy, based on how much time passed since the last read
+        '''
+        
+        num_to_skip = self._drop_policy.start_read()
+        skip_to_newest = num_to_skip is None
         
-        # Only 'use' frames that take some time to read
+        # When skipping to the newest frame, only 'use' frames that take some time to read
         # -> This implies we 'waited' for the frame, rather than reading from a buffer
+        buffered_read_ms = 0.5 * self._drop_policy.get_frame_period_ms()
+        num_grabbed = 0
         while True:
             t1 = perf_counter()
             rec_frame = self.cap.grab()
             t2 = perf_counter()
+            if not rec_frame:
+                break
+            
+            num_grabbed += 1
+            self._grab_count += 1
+            is_waited_for = (1000 * (t2 - t1)) > buffered_read_ms
+            self._measure_frame_period(t2, is_waited_for)
             
-            time_taken_ms = int(1000 * (t2 - t1))
-            if (time_taken_ms > self._min_read_time_ms) or (not rec_frame):
+            done_skipping = is_waited_for if skip_to_newest else (num_grabbed > num_to_skip)
+            if done_skipping:
                 break
         
         # Try decoding frame data
         rec_frame, frame = self.cap.retrieve() if rec_frame else (rec_frame, None)
+        if rec_frame:
+            self._capture_info = (self._grab_count - 1, t2, 1000 * (perf_counter() - t2))
+        self._num_dropped += max(0, num_grabbed - 1)
+        self._drop_policy.end_read(rec_frame)
         
         return rec_frame, frame
 
@@ -133,64 +333,1063 @@ class VideoStreamReader(FrameReader):
         Returns False if there were no buffered frames.
         '''
         
-        video_fps = self.cap.get(cv2.CAP_PROP_FPS)
-        read_ms_threshold = round(0.85 * 1000.0 / video_fps)
+        read_ms_threshold = round(0.85 * self._drop_policy.get_frame_period_ms())
         
         for N in range(max_frames_to_exhaust):
             
             t1 = perf_counter()
             rec_frame = self.cap.grab()
             t2 = perf_counter()
-            assert rec_frame, "Error exhausting frames, no data!"
+            if not rec_frame:
+                break
             
             read_time_ms = round(1000 * (t2 - t1))
             long_read_time = (read_time_ms >= read_ms_threshold)
             if long_read_time:
                 break
         
-        had_buffered_frames = N > 0
-        return had_buffered_frames
+        had_buffered_frames = N > 0
+        return had_buffered_frames
+    
+    # .................................................................................................................
+    
+    def release(self) -> None:
+        
+        self._stop_event.set()
+        if self._reconnect_thread is not None:
+            self._reconnect_thread.join(timeout = 1.0)
+        self.cap.release()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _measure_frame_period(self, grab_time: float, is_waited_for: bool) -> None:
+        
+        '''
+        Helper used to measure how often frames arrive from the source, after each (successful) grab
+        Uses stream timestamps when available, since these aren't affected by buffering. Otherwise,
+        the time between consecutive frames that we had to wait for is used
+        '''
+        
+        stream_time_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if stream_time_ms > 0 and self._prev_stream_time_ms is not None:
+            self._drop_policy.add_frame_period(stream_time_ms - self._prev_stream_time_ms)
+        elif is_waited_for and self._prev_waited_grab_time is not None:
+            self._drop_policy.add_frame_period(1000 * (grab_time - self._prev_waited_grab_time))
+        
+        self._prev_stream_time_ms = stream_time_ms if stream_time_ms > 0 else None
+        self._prev_waited_grab_time = grab_time if is_waited_for else None
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _start_reconnect(self) -> None:
+        
+        ''' Helper used to start reconnecting to the video source, on a separate thread '''
+        
+        if self.is_reconnecting():
+            return
+        
+        self._reconnect_thread = threading.Thread(target = self._reconnect, daemon = True)
+        self._reconnect_thread.start()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _reconnect(self) -> bool:
+        
+        '''
+        Helper used to repeatedly try re-opening the video source, waiting longer after each failed attempt
+        Returns True if reconnected or False if stopped (e.g. on release) before reconnecting
+        '''
+        
+        self.cap.release()
+        self._backoff.reset()
+        print("", "Lost connection to video source, reconnecting...", sep = "\n", flush = True)
+        
+        while self._backoff.wait(self._stop_event):
+            new_cap = cv2.VideoCapture(self._source)
+            if new_cap.isOpened():
+                
+                # Update sizing, in case the source resolution changed while disconnected
+                frame_w = int(round(new_cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+                frame_h = int(round(new_cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                self._shape = (frame_h, frame_w, 3)
+                self.cap = new_cap
+                print("Reconnected!", flush = True)
+                return True
+            new_cap.release()
+        
+        return False
+    
+    # .................................................................................................................
+
+
+class ThreadedStreamReader(VideoStreamReader):
+    
+    '''
+    Class for reading from 'streaming' video sources using a background capture thread
+    The thread continuously reads (and decodes) frames into a small ring buffer,
+    while reading from this object always returns the newest available frame.
+    Frames that were captured but never read are counted as 'dropped'
+    
+    If the source disconnects, the capture thread handles reconnecting,
+    while reads continue to return the last good frame
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, video_source: str | int, ring_buffer_size = 2, read_timeout_sec = 5.0):
+        
+        super().__init__(video_source)
+        self._read_timeout_sec = read_timeout_sec
+        
+        # Storage for frames shared with the capture thread
+        self._ring = deque(maxlen = max(1, ring_buffer_size))
+        self._new_frame_cond = threading.Condition()
+        self._capture_count = 0
+        self._capture_ok = True
+        
+        # Consumer-side book keeping, used to count frames that were never read
+        self._last_read_count = 0
+        self._num_dropped = 0
+        
+        # Capture thread control
+        self._thread = None
+        self._is_reconnecting = False
+    
+    # .................................................................................................................
+    
+    def __iter__(self):
+        
+        ''' Called when using this object in an iterator (e.g. for loops) '''
+        
+        if not self.cap.isOpened():
+            self.cap = cv2.VideoCapture(self._source)
+        self._start_capture_thread()
+        
+        return self
+    
+    # .................................................................................................................
+    
+    def __next__(self) -> ndarray | None:
+        
+        read_ok, frame_bgr = self.read()
+        if not read_ok:
+            raise IOError("Error reading frames! Disconnected?")
+        
+        return frame_bgr
+    
+    # .................................................................................................................
+    
+    def get_num_dropped_frames(self) -> int:
+        return self._num_dropped
+    
+    # .................................................................................................................
+    
+    def is_reconnecting(self) -> bool:
+        return self._is_reconnecting
+    
+    # .................................................................................................................
+    
+    def read(self) -> tuple[bool, ndarray | None]:
+        
+        '''
+        Read the newest frame captured by the background thread
+        Waits for a frame that hasn't been read before, unless the source
+        is reconnecting (or stalls), in which case the last frame is repeated
+        '''
+        
+        self._start_capture_thread()
+        
+        with self._new_frame_cond:
+            have_new_frame = lambda: (self._capture_count > self._last_read_count) or (not self._capture_ok)
+            wait_sec = self._reconnect_poll_sec if self._is_reconnecting else self._read_timeout_sec
+            self._new_frame_cond.wait_for(have_new_frame, timeout = wait_sec)
+            
+            # Repeat the last good frame if nothing new is available
+            if self._capture_count == self._last_read_count:
+                have_last_frame = self._capture_ok and len(self._ring) > 0
+                return (True, self._ring[-1][1]) if have_last_frame else (False, None)
+            
+            # Newest frame wins, anything captured in between counts as dropped
+            frame = self._claim_newest_frame()
+        
+        return True, frame
+    
+    # .................................................................................................................
+    
+    def read_latest(self) -> tuple[bool, ndarray | None]:
+        
+        '''
+        Non-blocking alternative to read(), which is useful when reading from many sources at once
+        Returns is_new_frame, frame (which is None until the first frame is captured)
+        '''
+        
+        self._start_capture_thread()
+        
+        with self._new_frame_cond:
+            if len(self._ring) == 0:
+                return False, None
+            
+            is_new_frame = self._capture_count > self._last_read_count
+            frame = self._claim_newest_frame() if is_new_frame else self._ring[-1][1]
+        
+        return is_new_frame, frame
+    
+    # .................................................................................................................
+    
+    def exhaust_buffered_frames(self, max_frames_to_exhaust = 300) -> bool:
+        # No need to exhaust frames, the capture thread always keeps up with the source
+        return True
+    
+    # .................................................................................................................
+    
+    def release(self) -> None:
+        
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout = self._read_timeout_sec)
+            self._thread = None
+        self.cap.release()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _claim_newest_frame(self) -> ndarray:
+        
+        ''' Helper used to hand out the newest frame. Must be called while holding the frame lock! '''
+        
+        capture_idx, frame, capture_time, decode_ms = self._ring[-1]
+        self._num_dropped += capture_idx - self._last_read_count - 1
+        self._last_read_count = capture_idx
+        self._capture_info = (capture_idx - 1, capture_time, decode_ms)
+        
+        return frame
+    
+    # .................................................................................................................
+    
+    def _start_capture_thread(self) -> None:
+        
+        ''' Helper used to (lazily) start up the background capture thread '''
+        
+        if self._thread is not None:
+            return
+        
+        self._stop_event.clear()
+        self._thread = threading.Thread(target = self._capture_loop, daemon = True)
+        self._thread.start()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _capture_loop(self) -> None:
+        
+        ''' Runs on the capture thread, continuously decodes frames into the ring buffer '''
+        
+        while not self._stop_event.is_set():
+            
+            # Try to reconnect on read failures (reads will repeat the last good frame in the meantime)
+            t1 = perf_counter()
+            read_ok, frame = self.cap.read()
+            t2 = perf_counter()
+            if not read_ok:
+                self._is_reconnecting = True
+                is_reconnected = self._reconnect()
+                self._is_reconnecting = False
+                if not is_reconnected:
+                    break
+                continue
+            
+            with self._new_frame_cond:
+                self._capture_count += 1
+                self._ring.append((self._capture_count, frame, t2, 1000 * (t2 - t1)))
+                self._new_frame_cond.notify_all()
+        
+        # Wake up any waiting reads, since no more frames are coming
+        with self._new_frame_cond:
+            self._capture_ok = False
+            self._new_frame_cond.notify_all()
+        
+        return
+    
+    # .................................................................................................................
+
+
+class ProcessStreamReader(FrameReader):
+    
+    '''
+    Class for reading from 'streaming' video sources using a separate (child) decoder process
+    Frames are handed back through a ring of preallocated slots in shared memory, so that
+    decoding doesn't compete with inference for the GIL and frames are never pickled.
+    
+    Frames returned by this reader are read-only views into shared memory,
+    which are only valid until the next frame is read!
+    
+    If the source disconnects, the decoder process handles reconnecting,
+    while reads continue to return the last good frame
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, video_source: str | int, num_slots = 3, read_timeout_sec = 10.0):
+        
+        self._source = video_source
+        self._read_timeout_sec = read_timeout_sec
+        
+        # Forking is needed, so that the calling script doesn't re-run inside the decoder process
+        mp_ctx = get_fork_context()
+        assert mp_ctx is not None, "Process-based reading is not supported on this platform!"
+        
+        # Start decoder process, which will report the frame shape once the source is opened
+        self._frame_ring = SharedFrameRing(num_slots, mp_ctx)
+        self._stop_event = mp_ctx.Event()
+        self._is_reconnecting = mp_ctx.RawValue("b", 0)
+        self._reconnect_poll_sec = 0.05
+        parent_conn, child_conn = mp_ctx.Pipe()
+        proc_args = (video_source, self._frame_ring, child_conn, self._stop_event, self._is_reconnecting)
+        self._proc = mp_ctx.Process(target = _run_capture_process, args = proc_args, daemon = True)
+        self._proc.start()
+        
+        # Bail if the decoder couldn't open the source
+        is_opened, frame_shape = parent_conn.recv() if parent_conn.poll(read_timeout_sec) else (False, None)
+        if not is_opened:
+            self._stop_event.set()
+            self._proc.join(timeout = 1)
+            raise SystemExit("Unable to open video source!")
+        
+        # Allocate shared frame memory and let the decoder know where to find it
+        self._shape = frame_shape
+        shm_name = self._frame_ring.allocate(frame_shape)
+        parent_conn.send(shm_name)
+        
+        # Consumer-side book keeping, used to count frames that were never read
+        self._last_read_count = 0
+        self._num_dropped = 0
+        self._last_frame = None
+        self._capture_info = (-1, perf_counter(), 0.0)
+    
+    # .................................................................................................................
+    
+    def __iter__(self): return self
+    
+    # .................................................................................................................
+    
+    def __next__(self) -> ndarray | None:
+        
+        read_ok, frame_bgr = self.read()
+        if not read_ok:
+            raise IOError("Error reading frames! Disconnected?")
+        
+        return frame_bgr
+    
+    # .................................................................................................................
+    
+    def get_shape(self) -> tuple[int,int,int]:
+        return self._shape
+    
+    # .................................................................................................................
+    
+    def get_playback_position(self) -> float:
+        return 0.0
+    
+    # .................................................................................................................
+    
+    def get_num_dropped_frames(self) -> int:
+        return self._num_dropped
+    
+    # .................................................................................................................
+    
+    def is_reconnecting(self) -> bool:
+        return bool(self._is_reconnecting.value)
+    
+    # .................................................................................................................
+    
+    def get_capture_info(self) -> tuple[int, float, float]:
+        return self._capture_info
+    
+    # .................................................................................................................
+    
+    def read(self) -> tuple[bool, ndarray | None]:
+        
+        '''
+        Read the newest frame from the decoder process
+        Waits for a frame that hasn't been read before, unless the source
+        is reconnecting (or stalls), in which case the last frame is repeated
+        '''
+        
+        wait_sec = self._reconnect_poll_sec if self.is_reconnecting() else self._read_timeout_sec
+        frame_count, frame, frame_timing = self._frame_ring.read_newest(self._last_read_count, wait_sec)
+        if frame is None:
+            have_last_frame = (self._last_frame is not None) and (not self._frame_ring.is_closed())
+            return have_last_frame, self._last_frame
+        
+        self._store_newest_frame(frame_count, frame, frame_timing)
+        
+        return True, frame
+    
+    # .................................................................................................................
+    
+    def read_latest(self) -> tuple[bool, ndarray | None]:
+        
+        '''
+        Non-blocking alternative to read(), which is useful when reading from many sources at once
+        Returns is_new_frame, frame (which is None until the first frame is decoded)
+        '''
+        
+        frame_count, frame, frame_timing = self._frame_ring.read_newest(self._last_read_count, timeout_sec = 0)
+        is_new_frame = frame is not None
+        if is_new_frame:
+            self._store_newest_frame(frame_count, frame, frame_timing)
+        
+        return is_new_frame, self._last_frame
+    
+    # .................................................................................................................
+    
+    def exhaust_buffered_frames(self, max_frames_to_exhaust = 300) -> bool:
+        # No need to exhaust frames, the decoder process always keeps up with the source
+        return True
+    
+    # .................................................................................................................
+    
+    def release(self) -> None:
+        
+        self._stop_event.set()
+        self._proc.join(timeout = self._read_timeout_sec)
+        if self._proc.is_alive():
+            self._proc.terminate()
+        self._frame_ring.close()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _store_newest_frame(self, frame_count: int, frame: ndarray, frame_timing: tuple[float, float]) -> None:
+        
+        ''' Helper used to keep track of the newest frame (and its timing), counting any skipped frames as dropped '''
+        
+        self._num_dropped += frame_count - self._last_read_count - 1
+        self._last_read_count = frame_count
+        self._last_frame = frame
+        self._capture_info = (frame_count - 1, *frame_timing)
+        
+        return
+    
+    # .................................................................................................................
+
+
+class FFmpegStreamReader(FrameReader):
+    
+    '''
+    Class for reading from 'streaming' video sources using an ffmpeg subprocess
+    Frames are decoded & scaled down (and optionally reduced in frame rate) by ffmpeg
+    in a single step and streamed back as raw bgr data over a pipe. A background thread
+    reads the pipe into preallocated buffers, with reads always returning the newest frame.
+    
+    Frames returned by this reader are read-only views into the preallocated buffers,
+    which remain valid until (num_buffers - 2) more frames have been read
+    
+    If the source disconnects, ffmpeg is restarted by the pipe-reading thread,
+    while reads continue to return the last good frame
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, video_source: str, max_side_px = None, target_fps = None, num_buffers = 3,
+                 read_timeout_sec = 10.0):
+        
+        self._source = video_source
+        self._read_timeout_sec = read_timeout_sec
+        self._reconnect_poll_sec = 0.05
+        self._is_reconnecting = False
+        self._backoff = ReconnectBackoff()
+        
+        # Figure out the (scaled) output frame size
+        source_w, source_h = probe_frame_wh(video_source)
+        if source_w == 0 or source_h == 0:
+            raise SystemExit("Unable to open video source!")
+        frame_w, frame_h = source_w, source_h
+        if max_side_px is not None and max(source_w, source_h) > max_side_px:
+            scale_factor = max_side_px / max(source_w, source_h)
+            frame_w, frame_h = [2 * max(1, round(0.5 * side * scale_factor)) for side in (source_w, source_h)]
+        self._shape = (frame_h, frame_w, 3)
+        
+        # Build ffmpeg filter for scaling/frame rate reduction
+        filters_list = []
+        if (frame_w, frame_h) != (source_w, source_h):
+            filters_list.append(f"scale={frame_w}:{frame_h}")
+        if target_fps is not None:
+            filters_list.append(f"fps={target_fps}")
+        self._ffmpeg_cmd = make_ffmpeg_rawvideo_cmd(video_source, filters_list)
+        
+        # Allocate buffers for (raw) frame data, which the pipe is read into directly
+        num_buffers = max(3, num_buffers)
+        self._buffers = [bytearray(frame_w * frame_h * 3) for _ in range(num_buffers)]
+        self._frames = [np.frombuffer(buf, dtype = np.uint8).reshape(self._shape) for buf in self._buffers]
+        for frame in self._frames:
+            frame.flags.writeable = False
+        
+        # Storage for book keeping, shared with the pipe-reading thread
+        self._new_frame_cond = threading.Condition()
+        self._frame_count = 0
+        self._latest_slot = -1
+        self._read_slot = -1
+        self._write_slot = -1
+        self._capture_ok = True
+        
+        # Consumer-side book keeping, used to count frames that were never read
+        self._last_read_count = 0
+        self._num_dropped = 0
+        
+        # Timing info for each buffer (decoding happens inside ffmpeg, so only the arrival time is known)
+        self._buffer_capture_times = [0.0] * num_buffers
+        self._capture_info = (-1, perf_counter(), 0.0)
+        
+        # Subprocess & pipe-reading thread control (started on first read)
+        self._proc = None
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    # .................................................................................................................
+    
+    def __iter__(self):
+        self._start_ffmpeg()
+        return self
+    
+    # .................................................................................................................
+    
+    def __next__(self) -> ndarray | None:
+        
+        read_ok, frame_bgr = self.read()
+        if not read_ok:
+            raise IOError("Error reading frames! Disconnected?")
+        
+        return frame_bgr
+    
+    # .................................................................................................................
+    
+    def get_shape(self) -> tuple[int,int,int]:
+        return self._shape
+    
+    # .................................................................................................................
+    
+    def get_playback_position(self) -> float:
+        return 0.0
+    
+    # .................................................................................................................
+    
+    def get_num_dropped_frames(self) -> int:
+        return self._num_dropped
+    
+    # .................................................................................................................
+    
+    def is_reconnecting(self) -> bool:
+        return self._is_reconnecting
+    
+    # .................................................................................................................
+    
+    def get_capture_info(self) -> tuple[int, float, float]:
+        return self._capture_info
+    
+    # .................................................................................................................
+    
+    def read(self) -> tuple[bool, ndarray | None]:
+        
+        '''
+        Read the newest frame from ffmpeg
+        Waits for a frame that hasn't been read before, unless the source
+        is reconnecting (or stalls), in which case the last frame is repeated
+        '''
+        
+        self._start_ffmpeg()
+        
+        with self._new_frame_cond:
+            have_new_frame = lambda: (self._frame_count > self._last_read_count) or (not self._capture_ok)
+            wait_sec = self._reconnect_poll_sec if self._is_reconnecting else self._read_timeout_sec
+            self._new_frame_cond.wait_for(have_new_frame, timeout = wait_sec)
+            if self._frame_count == self._last_read_count:
+                have_last_frame = self._capture_ok and self._read_slot >= 0
+                return (True, self._frames[self._read_slot]) if have_last_frame else (False, None)
+            frame = self._claim_latest_frame()
+        
+        return True, frame
+    
+    # .................................................................................................................
+    
+    def read_latest(self) -> tuple[bool, ndarray | None]:
+        
+        '''
+        Non-blocking alternative to read(), which is useful when reading from many sources at once
+        Returns is_new_frame, frame (which is None until the first frame is decoded)
+        '''
+        
+        self._start_ffmpeg()
+        
+        with self._new_frame_cond:
+            if self._latest_slot < 0:
+                return False, None
+            is_new_frame = self._frame_count > self._last_read_count
+            frame = self._claim_latest_frame() if is_new_frame else self._frames[self._read_slot]
+        
+        return is_new_frame, frame
+    
+    # .................................................................................................................
+    
+    def exhaust_buffered_frames(self, max_frames_to_exhaust = 300) -> bool:
+        # No need to exhaust frames, the pipe-reading thread always keeps up with ffmpeg
+        return True
+    
+    # .................................................................................................................
+    
+    def release(self) -> None:
+        
+        self._stop_event.set()
+        if self._proc is not None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout = self._read_timeout_sec)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        if self._thread is not None:
+            self._thread.join(timeout = self._read_timeout_sec)
+            self._thread = None
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _start_ffmpeg(self) -> None:
+        
+        ''' Helper used to (lazily) start up the ffmpeg subprocess & pipe-reading thread '''
+        
+        if self._thread is not None:
+            return
+        
+        self._proc = self._launch_ffmpeg()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target = self._pipe_read_loop, daemon = True)
+        self._thread.start()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _claim_latest_frame(self) -> ndarray:
+        
+        ''' Helper used to hand out the newest frame. Must be called while holding the frame lock! '''
+        
+        self._num_dropped += self._frame_count - self._last_read_count - 1
+        self._last_read_count = self._frame_count
+        self._read_slot = self._latest_slot
+        self._capture_info = (self._frame_count - 1, self._buffer_capture_times[self._read_slot], 0.0)
+        
+        return self._frames[self._read_slot]
+    
+    # .................................................................................................................
+    
+    def _pipe_read_loop(self) -> None:
+        
+        ''' Runs on the pipe-reading thread, continuously copies frame data from ffmpeg into buffers '''
+        
+        num_buffers = len(self._buffers)
+        while not self._stop_event.is_set():
+            
+            # Pick a buffer that isn't holding the newest frame or the frame being read
+            with self._new_frame_cond:
+                busy_slots = (self._latest_slot, self._read_slot)
+                for offset in range(1, num_buffers + 1):
+                    slot_idx = (self._write_slot + offset) % num_buffers
+                    if slot_idx not in busy_slots:
+                        break
+                self._write_slot = slot_idx
+            
+            # Restart ffmpeg if the pipe closes (reads will repeat the last good frame in the meantime)
+            read_ok = read_pipe_into(self._proc.stdout, self._buffers[slot_idx])
+            if not read_ok:
+                if not self._is_reconnecting:
+                    self._is_reconnecting = True
+                    self._backoff.reset()
+                self._proc.kill()
+                self._proc.wait()
+                if not self._backoff.wait(self._stop_event):
+                    break
+                self._proc = self._launch_ffmpeg()
+                continue
+            self._is_reconnecting = False
+            
+            with self._new_frame_cond:
+                self._frame_count += 1
+                self._latest_slot = slot_idx
+                self._buffer_capture_times[slot_idx] = perf_counter()
+                self._new_frame_cond.notify_all()
+        
+        # Wake up any waiting reads, since no more frames are coming
+        with self._new_frame_cond:
+            self._capture_ok = False
+            self._new_frame_cond.notify_all()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _launch_ffmpeg(self) -> subprocess.Popen:
+        return subprocess.Popen(self._ffmpeg_cmd, stdout = subprocess.PIPE, stdin = subprocess.DEVNULL)
+    
+    # .................................................................................................................
+
+
+class VideoFileReader(VideoStreamReader):
+    
+    '''
+    Class used to read frames from a video file, as if it were a stream
+    Can optionally decode frames ahead of time (on a worker thread), so that
+    decoding overlaps with whatever processing is done on the returned frames
+    
+    Recently decoded frames can also be kept in a (memory-bounded) cache, so that
+    jumping around the playhead (e.g. when scrubbing) doesn't require re-decoding.
+    Cached frames are returned as read-only arrays, so they can't be modified by accident
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, video_path: str, prefetch_frames = 0, cache_size_mb = 0, read_timeout_sec = 5.0):
+        
+        super().__init__(video_path)
+        self._video_path = video_path
+        self._total_frames = self.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        
+        # Index of the next frame to be returned (used to report playback position)
+        # and index of the frame the capture will decode next (only used by the decoding thread)
+        self._next_frame_idx = 0
+        self._cap_frame_idx = 0
+        
+        # Keyframe indexing, which is loaded on a separate thread the first time we seek
+        self._keyframe_idxs = []
+        self._keyframe_thread = None
+        
+        # Storage for recently decoded frames (max frame count is set once we know the frame size)
+        self._frame_cache = OrderedDict()
+        self._cache_size_bytes = max(0, cache_size_mb) * (2 ** 20)
+        self._cache_max_frames = None
+        
+        # Storage for read-ahead decoding. Frames are queued along with a 'generation' counter,
+        # which is incremented on every seek, so that frames decoded before seeking can be discarded
+        self._prefetch_frames = max(0, prefetch_frames)
+        self._read_timeout_sec = read_timeout_sec
+        self._frame_queue = queue.Queue(maxsize = max(1, self._prefetch_frames))
+        self._seek_lock = threading.Lock()
+        self._seek_event = threading.Event()
+        self._seek_request_idx = None
+        self._generation = 0
+        self._thread = None
+    
+    # .................................................................................................................
+    
+    def __next__(self) -> ndarray | None:
+        
+        # Read next frame, or loop back to beginning if there are no more frames
+        read_ok, frame_bgr = self.read()
+        if not read_ok:
+            self.set_playback_position(0)
+            read_ok, frame_bgr = self.read()
+            if not read_ok: raise IOError("Error reading frames from file!")
+        
+        return frame_bgr
+    
+    # .................................................................................................................
+    
+    def get_playback_position(self) -> float:
+        return min(1.0, self._next_frame_idx / self._total_frames)
+    
+    # .................................................................................................................
+    
+    def set_playback_position(self, position_norm_01):
+        return self._set_next_frame_index(round(self._total_frames * position_norm_01))
+    
+    # .................................................................................................................
+    
+    def scrub_to(self, position_norm_01):
+        
+        '''
+        Alternative to setting the playback position, intended for fast/repeated seeking (e.g. while dragging)
+        Will jump to the nearest keyframe (which is fast to decode), unless the
+        exact frame is already cached. The keyframe index is built (in the background)
+        on first use, until then this behaves the same as setting the playback position
+        '''
+        
+        # Only index keyframes once scrubbing starts, since this reads through the whole file
+        self._start_keyframe_indexing()
+        
+        frame_idx = round(self._total_frames * position_norm_01)
+        if frame_idx not in self._frame_cache:
+            keyframe_idx = find_nearest_keyframe(self._keyframe_idxs, frame_idx)
+            frame_idx = frame_idx if keyframe_idx is None else keyframe_idx
+        
+        return self._set_next_frame_index(frame_idx)
+    
+    # .................................................................................................................
+    
+    def read(self):
+        
+        # Use cached frame data if possible (counts as being 'captured' now, with no decoding)
+        frame_idx = self._next_frame_idx
+        cached_frame = self._frame_cache.get(frame_idx, None)
+        if cached_frame is not None:
+            self._frame_cache.move_to_end(frame_idx)
+            self._next_frame_idx += 1
+            self._capture_info = (frame_idx, perf_counter(), 0.0)
+            return True, cached_frame
+        
+        # Decode directly or take frames from the read-ahead queue, if enabled
+        if self._prefetch_frames == 0:
+            read_ok, frame, frame_timing = self._decode_frame(frame_idx)
+        else:
+            self._start_prefetch_thread()
+            read_ok, frame_idx, frame, frame_timing = self._get_prefetched_frame()
+        
+        self._next_frame_idx = frame_idx + 1 if read_ok else frame_idx
+        if read_ok:
+            frame = self._store_cached_frame(frame_idx, frame)
+            self._capture_info = (frame_idx, *frame_timing)
+        
+        return read_ok, frame
+    
+    # .................................................................................................................
+    
+    def exhaust_buffered_frames(self, max_frames_to_exhaust = 300):
+        # No need to exhaust frames on files
+        return True
+    
+    # .................................................................................................................
+    
+    def release(self) -> None:
+        
+        # Shut down read-ahead worker, if needed
+        if self._thread is not None:
+            self._stop_event.set()
+            self._seek_event.set()
+            self._drain_frame_queue()
+            self._thread.join(timeout = self._read_timeout_sec)
+            self._thread = None
+        self.cap.release()
+        self._frame_cache.clear()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _set_next_frame_index(self, frame_idx: int):
+        
+        '''
+        Helper used to handle seeking. Without read-ahead, seeking is deferred until
+        the next read, so that repeated seeks only cost as much as the frames actually read
+        '''
+        
+        self._next_frame_idx = frame_idx
+        
+        # Bail if we don't need to notify the read-ahead worker
+        if self._prefetch_frames == 0:
+            return self
+        
+        # Have the worker skip over frames that are already cached
+        decode_idx = frame_idx
+        while decode_idx in self._frame_cache:
+            decode_idx += 1
+        
+        # Invalidate queued frames and have the worker seek before decoding anything else
+        with self._seek_lock:
+            self._generation += 1
+            self._seek_request_idx = decode_idx
+            self._seek_event.set()
+        self._drain_frame_queue()
+        
+        return self
+    
+    # .................................................................................................................
+    
+    def _decode_frame(self, frame_idx: int) -> tuple[bool, ndarray | None, tuple[float, float]]:
+        
+        '''
+        Helper used to decode a specific frame, seeking only if the capture isn't already there
+        Returns read_ok, frame, (capture_time, decode_ms)
+        '''
+        
+        if frame_idx != self._cap_frame_idx:
+            self._seek_capture(frame_idx)
+        
+        t1 = perf_counter()
+        read_ok, frame = self.cap.read()
+        t2 = perf_counter()
+        if read_ok:
+            self._cap_frame_idx += 1
+        
+        return read_ok, frame, (t2, 1000 * (t2 - t1))
     
     # .................................................................................................................
     
-    def release(self) -> None:
-        self.cap.release()
+    def _seek_capture(self, frame_idx: int) -> None:
+        
+        '''
+        Helper used to move the capture to a given frame index
+        Seeking requires decoding from the preceding keyframe. If we're already
+        past that keyframe, it's cheaper to decode forward from where we are
+        '''
+        
+        keyframe_idx = find_keyframe_before(self._keyframe_idxs, frame_idx)
+        can_decode_forward = (keyframe_idx is not None) and (keyframe_idx <= self._cap_frame_idx < frame_idx)
+        if can_decode_forward:
+            # Only count frames that were actually grabbed, so a failed grab doesn't leave us out of sync
+            while self._cap_frame_idx < frame_idx:
+                if not self.cap.grab():
+                    break
+                self._cap_frame_idx += 1
+        else:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            self._cap_frame_idx = frame_idx
+        
         return
     
     # .................................................................................................................
-
-
-class VideoFileReader(VideoStreamReader):
     
-    ''' Class used to read frames from a video file, as if it were a stream '''
+    def _store_cached_frame(self, frame_idx: int, frame: ndarray) -> ndarray:
+        
+        ''' Helper used to add frames to the cache, evicting the least recently used frames if needed '''
+        
+        # Bail if caching is disabled
+        if self._cache_size_bytes == 0:
+            return frame
+        
+        if self._cache_max_frames is None:
+            self._cache_max_frames = max(1, self._cache_size_bytes // frame.nbytes)
+        
+        frame.flags.writeable = False
+        self._frame_cache[frame_idx] = frame
+        self._frame_cache.move_to_end(frame_idx)
+        while len(self._frame_cache) > self._cache_max_frames:
+            self._frame_cache.popitem(last = False)
+        
+        return frame
     
     # .................................................................................................................
     
-    def __init__(self, video_path: str):
-        super().__init__(video_path)
-        self._total_frames = self.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    def _start_keyframe_indexing(self) -> None:
+        
+        ''' Helper used to load keyframe indexing in the background, so that seeking doesn't stall '''
+        
+        if self._keyframe_thread is not None:
+            return
+        
+        def _load_keyframes():
+            self._keyframe_idxs = load_keyframe_index(self._video_path)
+        
+        self._keyframe_thread = threading.Thread(target = _load_keyframes, daemon = True)
+        self._keyframe_thread.start()
+        
+        return
     
     # .................................................................................................................
     
-    def get_playback_position(self) -> float:
-        return min(1.0, self.cap.get(cv2.CAP_PROP_POS_FRAMES) / self._total_frames)
+    def _start_prefetch_thread(self) -> None:
+        
+        ''' Helper used to (lazily) start up the read-ahead worker thread '''
+        
+        if self._thread is not None:
+            return
+        
+        # Make sure the worker starts decoding from the current playback position
+        with self._seek_lock:
+            self._seek_request_idx = self._next_frame_idx
+        
+        self._stop_event.clear()
+        self._thread = threading.Thread(target = self._prefetch_loop, daemon = True)
+        self._thread.start()
+        
+        return
     
     # .................................................................................................................
     
-    def set_playback_position(self, position_norm_01):
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, round(self._total_frames * position_norm_01))
-        return self
+    def _prefetch_loop(self) -> None:
+        
+        ''' Runs on the read-ahead thread, decoding frames into the (bounded) frame queue '''
+        
+        frame_idx = 0
+        generation = self._generation
+        while not self._stop_event.is_set():
+            
+            # Handle seek requests before decoding
+            with self._seek_lock:
+                seek_idx, self._seek_request_idx = self._seek_request_idx, None
+                generation = self._generation
+                self._seek_event.clear()
+            if seek_idx is not None:
+                frame_idx = seek_idx
+            
+            read_ok, frame, frame_timing = self._decode_frame(frame_idx)
+            self._put_prefetched((generation, frame_idx, read_ok, frame, frame_timing))
+            frame_idx += 1
+            
+            # Wait for a seek at the end of the file, rather than repeatedly failing to read
+            if not read_ok:
+                self._seek_event.wait()
+        
+        return
     
     # .................................................................................................................
     
-    def read(self):
-        return self.cap.read()
+    def _put_prefetched(self, queue_item) -> None:
+        
+        ''' Helper used to queue decoded frames, giving up if the frame becomes outdated (e.g. from seeking) '''
+        
+        generation = queue_item[0]
+        while not self._stop_event.is_set() and generation == self._generation:
+            try:
+                self._frame_queue.put(queue_item, timeout = 0.05)
+                break
+            except queue.Full:
+                pass
+        
+        return
     
     # .................................................................................................................
     
-    def exhaust_buffered_frames(self, max_frames_to_exhaust = 300):
-        # No need to exhaust frames on files
-        return True
+    def _get_prefetched_frame(self) -> tuple[bool, int, ndarray | None, tuple[float, float]]:
+        
+        '''
+        Helper used to take frames from the read-ahead queue, skipping any that were decoded
+        before the latest seek or which come before the current playback position
+        (which can happen if cached frames were returned in the meantime)
+        Returns read_ok, frame_index, frame, (capture_time, decode_ms)
+        '''
+        
+        while True:
+            try:
+                queue_item = self._frame_queue.get(timeout = self._read_timeout_sec)
+            except queue.Empty:
+                return False, self._next_frame_idx, None, (perf_counter(), 0.0)
+            
+            generation, frame_idx, read_ok, frame, frame_timing = queue_item
+            is_outdated = (generation != self._generation) or (read_ok and frame_idx < self._next_frame_idx)
+            if not is_outdated:
+                break
+        
+        return read_ok, frame_idx, frame, frame_timing
+    
+    # .................................................................................................................
+    
+    def _drain_frame_queue(self) -> None:
+        
+        while True:
+            try:
+                self._frame_queue.get_nowait()
+            except queue.Empty:
+                break
+        
+        return
     
     # .................................................................................................................
     
@@ -241,6 +1440,9 @@ class ImageFileReader(FrameReader):
         
         # Mimic other video readers
         self._shape = self._image.shape
+        
+        # Hand out the same (read-only) image on every read, rather than copying
+        self._image.flags.writeable = False
     
     # .................................................................................................................
     
@@ -250,7 +1452,7 @@ class ImageFileReader(FrameReader):
     
     def get_shape(self): return self._shape
     
-    def read(self): return self._image.copy()
+    def read(self): return self._image
     
     def release(self): return
     
@@ -280,13 +1482,244 @@ class ImageFileReader(FrameReader):
     # .................................................................................................................
 
 
+class ImageSequenceReader(FrameReader):
+    
+    '''
+    Class used to play back a sequence of images (from a folder or glob pattern) as if it were a video
+    Images are decoded ahead of the playback position on a worker thread and kept in a
+    memory-bounded cache. Frames are returned as read-only arrays (no copying)
+    '''
+    
+    # .................................................................................................................
+    
+    def __init__(self, images_source: str, cache_size_mb = 256, read_ahead_frames = 8, read_timeout_sec = 5.0):
+        
+        self._source = images_source
+        self._image_paths = get_image_sequence_paths(images_source)
+        assert len(self._image_paths) > 0, f"No images found: {images_source}"
+        self._num_frames = len(self._image_paths)
+        
+        # Load first image to figure out the frame sizing
+        first_image = cv2.imread(self._image_paths[0])
+        assert (first_image is not None), f"Invalid image file: {self._image_paths[0]}"
+        self._shape = first_image.shape
+        
+        # Storage for decoded frames, shared with the decoding thread
+        self._frame_cache = OrderedDict()
+        self._cache_nbytes = 0
+        self._cache_size_bytes = max(first_image.nbytes, cache_size_mb * (2 ** 20))
+        self._cache_cond = threading.Condition()
+        self._read_timeout_sec = read_timeout_sec
+        
+        # Don't read further ahead than the cache can hold
+        max_cache_frames = self._cache_size_bytes // first_image.nbytes
+        self._read_ahead_frames = max(1, min(read_ahead_frames, max_cache_frames - 1))
+        
+        # Playback & decoding thread control
+        self._next_frame_idx = 0
+        self._capture_info = (-1, perf_counter(), 0.0)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._store_cached_frame(0, first_image)
+    
+    # .................................................................................................................
+    
+    def __iter__(self): return self
+    
+    # .................................................................................................................
+    
+    def __next__(self) -> ndarray | None:
+        
+        # Skip over unreadable images (with a warning), unless none of the images can be read
+        for _ in range(self._num_frames):
+            
+            # Loop back to the beginning once we run out of images
+            if self._next_frame_idx >= self._num_frames:
+                self._next_frame_idx = 0
+            
+            # Record the index before reading, since reading advances playback
+            frame_idx = self._next_frame_idx
+            read_ok, frame = self.read()
+            if read_ok:
+                return frame
+            print("", f"WARNING: Skipping unreadable image: {self._image_paths[frame_idx]}", sep="\n", flush=True)
+        
+        raise IOError(f"Error reading images: {self._source}")
+    
+    # .................................................................................................................
+    
+    def get_shape(self) -> tuple[int,int,int]:
+        return self._shape
+    
+    # .................................................................................................................
+    
+    def get_playback_position(self) -> float:
+        return min(1.0, self._next_frame_idx / self._num_frames)
+    
+    # .................................................................................................................
+    
+    def get_capture_info(self) -> tuple[int, float, float]:
+        return self._capture_info
+    
+    # .................................................................................................................
+    
+    def set_playback_position(self, position_norm_01):
+        
+        with self._cache_cond:
+            self._next_frame_idx = min(self._num_frames - 1, round(self._num_frames * position_norm_01))
+            self._cache_cond.notify_all()
+        
+        return self
+    
+    # .................................................................................................................
+    
+    def read(self) -> tuple[bool, ndarray | None]:
+        
+        ''' Read the next image in the sequence, waiting for the decoding thread if needed '''
+        
+        self._start_decode_thread()
+        
+        frame_idx = self._next_frame_idx
+        if frame_idx >= self._num_frames:
+            return False, None
+        
+        with self._cache_cond:
+            is_cached = lambda: (frame_idx in self._frame_cache) or (not self._thread.is_alive())
+            self._cache_cond.wait_for(is_cached, timeout = self._read_timeout_sec)
+            frame = self._frame_cache.get(frame_idx, None)
+            if frame is not None:
+                self._frame_cache.move_to_end(frame_idx)
+            
+            # Advance playback & wake up the decoder so it can keep reading ahead
+            self._next_frame_idx = frame_idx + 1
+            self._cache_cond.notify_all()
+        
+        # Images are decoded ahead of time, so they count as being 'captured' when read
+        self._capture_info = (frame_idx, perf_counter(), 0.0)
+        
+        # Unreadable images are stored as empty entries, so we don't keep trying to decode them
+        read_ok = (frame is not None) and (frame.size > 0)
+        
+        return read_ok, (frame if read_ok else None)
+    
+    # .................................................................................................................
+    
+    def release(self) -> None:
+        
+        self._stop_event.set()
+        with self._cache_cond:
+            self._cache_cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout = self._read_timeout_sec)
+            self._thread = None
+        self._frame_cache.clear()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def exhaust_buffered_frames(self, max_frames_to_exhaust = 300) -> bool:
+        # No need to exhaust frames on files
+        return True
+    
+    # .................................................................................................................
+    
+    def _start_decode_thread(self) -> None:
+        
+        ''' Helper used to (lazily) start up the decoding thread '''
+        
+        if self._thread is not None:
+            return
+        
+        self._stop_event.clear()
+        self._thread = threading.Thread(target = self._decode_loop, daemon = True)
+        self._thread.start()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _decode_loop(self) -> None:
+        
+        ''' Runs on the decoding thread, reads images that are just ahead of the playback position '''
+        
+        while not self._stop_event.is_set():
+            
+            # Wait until there is an image near the playback position that hasn't been decoded
+            with self._cache_cond:
+                self._cache_cond.wait_for(lambda: self._get_missing_index() is not None or self._stop_event.is_set())
+                frame_idx = self._get_missing_index()
+            if frame_idx is None:
+                continue
+            
+            # Decode outside of lock, so reading isn't blocked
+            # -> Failed reads store empty frames, so they're not retried over and over
+            frame = cv2.imread(self._image_paths[frame_idx])
+            frame = np.empty((0,0,3), dtype = np.uint8) if frame is None else frame
+            with self._cache_cond:
+                self._store_cached_frame(frame_idx, frame)
+                self._cache_cond.notify_all()
+        
+        return
+    
+    # .................................................................................................................
+    
+    def _get_missing_index(self) -> int | None:
+        
+        ''' Helper used to find the next image (within the read-ahead window) that needs decoding '''
+        
+        for offset in range(self._read_ahead_frames):
+            frame_idx = (self._next_frame_idx + offset) % self._num_frames
+            if frame_idx not in self._frame_cache:
+                return frame_idx
+        
+        return None
+    
+    # .................................................................................................................
+    
+    def _store_cached_frame(self, frame_idx: int, frame: ndarray) -> None:
+        
+        ''' Helper used to add frames to the cache, evicting the least recently used frames to stay in budget '''
+        
+        frame.flags.writeable = False
+        self._frame_cache[frame_idx] = frame
+        self._cache_nbytes += frame.nbytes
+        while self._cache_nbytes > self._cache_size_bytes and len(self._frame_cache) > 1:
+            _, evicted_frame = self._frame_cache.popitem(last = False)
+            self._cache_nbytes -= evicted_frame.nbytes
+        
+        return
+    
+    # .................................................................................................................
+    
+    @staticmethod
+    def is_valid_image_sequence(video_source: str) -> bool:
+        
+        ''' Helper used to check if the given video source is a folder or glob pattern of images '''
+        
+        is_folder = osp.isdir(video_source)
+        is_glob = any(char in video_source for char in "*?[")
+        if not (is_folder or is_glob):
+            return False
+        
+        return len(get_image_sequence_paths(video_source)) > 0
+    
+    # .................................................................................................................
+
+
 class PlaybackBar:
     
-    def __init__(self, frame_reader_ref, bg_color = (100,95,85), line_color = (255,255,255), bar_height = 80):
+    def __init__(self, frame_reader_ref, bg_color = (100,95,85), line_color = (255,255,255), bar_height = 80,
+                 seek_debounce_ms = 50):
         
         # Store access to frame reader, so we can control playback
         self._reader = frame_reader_ref
         
+        # Use fast seeking while dragging, if the reader supports it
+        self._drag_seek = getattr(self._reader, "scrub_to", None)
+        if self._drag_seek is None:
+            self._drag_seek = getattr(self._reader, "set_playback_position", None)
+        
         # Figure out whether we should be enabled, based on whether we can control the reader
         is_controllable_source = False
         try:
@@ -310,6 +1743,13 @@ class PlaybackBar:
         self._interact_y_offset = 0
         self._interact_y1y2 = (-10, -10)
         self._enable = is_controllable_source
+        
+        # Seek settings, used to limit how often the playback position changes while dragging
+        self._seek_debounce_sec = seek_debounce_ms / 1000.0
+        self._last_seek_time = -self._seek_debounce_sec
+        self._drag_x_norm = 0
+        self._seek_x_norm = None
+        self._need_final_seek = False
     
     def enable(self, enable = True):
         self._enable = enable
@@ -331,6 +1771,8 @@ class PlaybackBar:
         #    drag 'outside' the playback bar area (as long as they began the drag inside it!)
         bar_w = self._base_img.shape[1]
         self._x_norm = min(1.0, max(0.0, x / (bar_w - 1)))
+        if self._mouse_pressed:
+            self._drag_x_norm = self._x_norm
         
         # Respond to mouse release, since this should stop playback control
         if event == cv2.EVENT_LBUTTONUP:
@@ -343,6 +1785,9 @@ class PlaybackBar:
         mouse_is_down = event == cv2.EVENT_LBUTTONDOWN
         if is_interacting_y and mouse_is_down:
             self._mouse_pressed = True
+            self._drag_x_norm = self._x_norm
+            self._seek_x_norm = None
+            self._last_seek_time = -self._seek_debounce_sec
         
         return
     
@@ -377,24 +1822,293 @@ class PlaybackBar:
 
     def adjust_playback_on_drag(self):
         
-        # Only adjust position when the mouse is held down
-        if self._mouse_pressed:
-            self._reader.set_playback_position(self._x_norm)
+        # Once dragging stops, make sure we end up at the exact position that was released on
+        # -> Seeks while dragging may land on nearby (keyframe) positions, which are faster to jump to
+        if not self._mouse_pressed:
+            if self._need_final_seek:
+                self._reader.set_playback_position(self._drag_x_norm)
+                self._need_final_seek = False
+            return self
+        
+        # Only move to new positions every so often while dragging
+        # -> Seeking isn't free (e.g. it resets frame prefetching), so only seek when the position changes
+        curr_time = perf_counter()
+        is_debounced = (curr_time - self._last_seek_time) < self._seek_debounce_sec
+        if not is_debounced and self._drag_x_norm != self._seek_x_norm:
+            self._seek_x_norm = self._drag_x_norm
+            self._last_seek_time = curr_time
+            self._drag_seek(self._seek_x_norm)
+        self._need_final_seek = True
         
         return self
 
 # ---------------------------------------------------------------------------------------------------------------------
 #%% Functions
 
-def make_video_reader(video_source):
+def _run_capture_process(video_source, frame_ring: SharedFrameRing, conn, stop_event, is_reconnecting) -> None:
+    
+    '''
+    Function which runs inside of the decoder process used by the ProcessStreamReader
+    Decodes frames directly into shared memory slots, until told to stop
+    Handles reconnecting if the source disconnects
+    '''
+    
+    # Report back on whether the source could be opened, along with the frame shape
+    cap = cv2.VideoCapture(video_source)
+    if not cap.isOpened():
+        conn.send((False, None))
+        return
+    frame_w = int(round(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    frame_h = int(round(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    frame_shape = (frame_h, frame_w, 3)
+    conn.send((True, frame_shape))
+    
+    # Wait for parent to allocate shared memory for frame data
+    shm_name = conn.recv()
+    frame_ring.attach(shm_name, frame_shape)
+    
+    frame_count = 0
+    backoff = ReconnectBackoff()
+    try:
+        while not stop_event.is_set():
+            
+            # Decode straight into shared memory, if possible
+            slot_idx, slot_frame = frame_ring.claim_write_slot()
+            read_ok = cap.grab()
+            t1 = perf_counter()
+            if read_ok:
+                read_ok, frame = cap.retrieve(slot_frame)
+            
+            # Try to re-open the source on read failures (parent repeats the last good frame in the meantime)
+            if not read_ok:
+                is_reconnecting.value = 1
+                cap.release()
+                backoff.reset()
+                while backoff.wait(stop_event):
+                    cap = cv2.VideoCapture(video_source)
+                    if cap.isOpened():
+                        break
+                    cap.release()
+                is_reconnecting.value = 0
+                continue
+            
+            # Copy/resize into shared memory if the decoder didn't write into it directly
+            if not np.shares_memory(frame, slot_frame):
+                cv2.resize(frame, dsize = (frame_w, frame_h), dst = slot_frame)
+            
+            frame_count += 1
+            frame_ring.publish(slot_idx, frame_count, capture_time = t1, decode_ms = 1000 * (perf_counter() - t1))
+    
+    finally:
+        frame_ring.mark_closed()
+        frame_ring.close()
+        cap.release()
+    
+    return
+
+def probe_frame_wh(video_source: str) -> tuple[int, int]:
+    
+    '''
+    Helper used to get the frame width & height of a video source, using ffprobe if available
+    Returns (0, 0) if the source can't be read
+    '''
+    
+    ffprobe_path = shutil.which("ffprobe")
+    if ffprobe_path is not None:
+        probe_cmd = [ffprobe_path, "-v", "error", "-select_streams", "v:0",
+                     "-show_entries", "stream=width,height", "-of", "csv=p=0", video_source]
+        try:
+            probe_result = subprocess.run(probe_cmd, capture_output=True, text=True, check=True, timeout=30)
+            frame_w, frame_h = [int(value) for value in probe_result.stdout.strip().split(",")[0:2]]
+            return frame_w, frame_h
+        except (OSError, ValueError, subprocess.SubprocessError):
+            pass
+    
+    # Fall back to checking with opencv
+    vcap = cv2.VideoCapture(video_source)
+    frame_w = int(round(vcap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    frame_h = int(round(vcap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    vcap.release()
+    
+    return frame_w, frame_h
+
+def make_ffmpeg_rawvideo_cmd(video_source: str, filters_list: list[str]) -> list[str]:
+    
+    ''' Helper used to build an ffmpeg command which outputs raw bgr frame data to stdout '''
+    
+    # Favor low latency & reliable (tcp) transport for rtsp sources
+    input_args = ["-fflags", "nobuffer", "-flags", "low_delay"]
+    if video_source.lower().startswith("rtsp"):
+        input_args += ["-rtsp_transport", "tcp"]
+    
+    filter_args = ["-vf", ",".join(filters_list)] if len(filters_list) > 0 else []
+    output_args = ["-an", "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+    
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error", *input_args, "-i", video_source, *filter_args, *output_args]
+
+def read_pipe_into(pipe, buffer: bytearray) -> bool:
+    
+    ''' Helper used to completely fill a buffer from a pipe. Returns False if the pipe closes before filling '''
+    
+    buffer_view = memoryview(buffer)
+    num_bytes_read, num_bytes_total = 0, len(buffer)
+    while num_bytes_read < num_bytes_total:
+        chunk_size = pipe.readinto(buffer_view[num_bytes_read:])
+        if not chunk_size:
+            return False
+        num_bytes_read += chunk_size
+    
+    return True
+
+def get_image_sequence_paths(images_source: str,
+                             allowable_exts = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")) -> list[str]:
+    
+    '''
+    Helper used to get a listing of image paths from either a folder path or a glob pattern
+    (e.g. "/path/to/images/*.png"). Paths are sorted in 'natural' order, so that
+    numbering like: img_9, img_10 is ordered as expected
+    '''
+    
+    # Get all files in folder (filtered by extension) or whatever files match the given pattern
+    if osp.isdir(images_source):
+        file_paths = [osp.join(images_source, name) for name in os.listdir(images_source)]
+        file_paths = [path for path in file_paths if osp.splitext(path.lower())[1] in allowable_exts]
+    else:
+        file_paths = glob(images_source)
+    file_paths = [path for path in file_paths if osp.isfile(path)]
+    
+    natural_sort_key = lambda path: [int(s) if s.isdigit() else s.lower() for s in re.split(r"(\d+)", path)]
+    
+    return sorted(file_paths, key = natural_sort_key)
+
+def load_keyframe_index(video_path: str) -> list[int]:
+    
+    '''
+    Helper used to get a (sorted) listing of keyframe indices for a video file
+    The listing is built using ffprobe (if available) and saved next to the video
+    file (as <video_path>.keyframes.json), so it only needs to be built once per file
+    Returns an empty list if the index can't be built
+    '''
+    
+    # Use the saved index, as long as the video file hasn't changed since it was built
+    index_path = f"{video_path}.keyframes.json"
+    file_info = {"size": osp.getsize(video_path), "mtime": osp.getmtime(video_path)}
+    try:
+        with open(index_path, "r") as in_file:
+            index_data = json.load(in_file)
+        if index_data["file_info"] == file_info:
+            return index_data["keyframes"]
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        pass
+    
+    # Save new index for re-use (not a problem if this fails, we'll just rebuild next time)
+    keyframe_idxs = _build_keyframe_index(video_path)
+    if len(keyframe_idxs) > 0:
+        try:
+            with open(index_path, "w") as out_file:
+                json.dump({"file_info": file_info, "keyframes": keyframe_idxs}, out_file)
+        except OSError:
+            pass
+    
+    return keyframe_idxs
+
+def _build_keyframe_index(video_path: str) -> list[int]:
+    
+    '''
+    Helper used to find keyframes using ffprobe, which only needs to read packet headers (no decoding)
+    Packets are listed in decoding order, so they're sorted by timestamp to get frame indices
+    '''
+    
+    ffprobe_path = shutil.which("ffprobe")
+    if ffprobe_path is None:
+        return []
+    
+    probe_cmd = [ffprobe_path, "-v", "error", "-select_streams", "v:0",
+                 "-show_entries", "packet=pts,dts,flags", "-of", "csv=print_section=0", video_path]
+    try:
+        probe_result = subprocess.run(probe_cmd, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    
+    # Each line is of the form: pts,dts,flags (e.g. 1024,512,K__)
+    timestamp_keyflag_list = []
+    for line in probe_result.stdout.splitlines():
+        pts_str, dts_str, flags_str, *_ = line.strip().split(",") + ["", "", ""]
+        timestamp_str = dts_str if pts_str == "N/A" else pts_str
+        try:
+            timestamp_keyflag_list.append((int(timestamp_str), "K" in flags_str))
+        except ValueError:
+            continue
+    timestamp_keyflag_list.sort()
+    
+    return [idx for idx, (_, is_keyframe) in enumerate(timestamp_keyflag_list) if is_keyframe]
+
+def find_keyframe_before(keyframe_idxs: list[int], frame_idx: int) -> int | None:
+    
+    ''' Helper used to find the closest keyframe at or before the given frame index. Returns None if missing '''
+    
+    list_idx = bisect_right(keyframe_idxs, frame_idx) - 1
+    
+    return keyframe_idxs[list_idx] if list_idx >= 0 else None
+
+def find_nearest_keyframe(keyframe_idxs: list[int], frame_idx: int) -> int | None:
+    
+    ''' Helper used to find the closest keyframe to the given frame index. Returns None if there are no keyframes '''
+    
+    list_idx = bisect_right(keyframe_idxs, frame_idx)
+    candidate_idxs = keyframe_idxs[max(0, list_idx - 1):(list_idx + 1)]
+    if len(candidate_idxs) == 0:
+        return None
+    
+    return min(candidate_idxs, key = lambda idx: abs(idx - frame_idx))
+
+def make_video_reader(video_source, stream_backend = "sync", prefetch_frames = 0, cache_size_mb = 0,
+                      max_side_px = None, target_fps = None, drop_mode = "auto"):
+    
+    '''
+    Helper used to instantiate a video reader, based on the input type (eg. rtsp vs. video file)
+    Video files can be decoded ahead of time (on a separate thread) by setting prefetch_frames above 0,
+    and recently decoded frames can be cached (to speed up seeking) by setting cache_size_mb above 0
+    Folders of images (or glob patterns, like "/path/to/*.jpg") are played back as if they were videos
+    The stream_backend controls how 'streaming' sources (rtsp/webcams) are read:
+        "sync" - frames are read on the calling thread, skipping frames based on the drop_mode
+                 (one of: "auto", "all", "nth" or "newest", see AdaptiveDropPolicy)
+        "threaded" - frames are read on a background thread, always returning the newest frame
+        "process" - frames are decoded in a separate process and handed back through shared memory
+        "ffmpeg" - frames are decoded & scaled (to max_side_px) by an ffmpeg subprocess, optionally
+                   reducing the frame rate (to target_fps). Not supported for webcams
+    '''
+    
+    # Fall back to threaded reading if we can't use a separate decoder process
+    if stream_backend == "process" and get_fork_context() is None:
+        print("", "Process-based reading is not supported on this platform, using threaded reading!", sep="\n")
+        stream_backend = "threaded"
     
-    ''' Helper used to instantiate a video reader, based on the input type (eg. rtsp vs. video file) '''
+    # Same goes for ffmpeg, if it isn't installed
+    if stream_backend == "ffmpeg" and shutil.which("ffmpeg") is None:
+        print("", "Could not find ffmpeg, using threaded reading!", sep="\n")
+        stream_backend = "threaded"
+    
+    # Figure out which reader to use for streaming sources
+    stream_reader_lut = {
+        "sync": lambda source: VideoStreamReader(source, drop_mode),
+        "threaded": ThreadedStreamReader,
+        "process": ProcessStreamReader,
+        "ffmpeg": lambda source: FFmpegStreamReader(source, max_side_px, target_fps),
+    }
+    assert stream_backend in stream_reader_lut, f"Unknown stream backend: {stream_backend}"
+    StreamReader = stream_reader_lut[stream_backend]
     
     # Make sure we don't get extra spaces & look for possible webcam inputs
     video_source = str(video_source).strip()
     if video_source.lower() in ("webcam", "cam"):
         video_source = "0"
     
+    # Check for folders of images (or glob patterns) before checking for single files
+    is_image_sequence = ImageSequenceReader.is_valid_image_sequence(video_source)
+    if is_image_sequence:
+        return "images", ImageSequenceReader(video_source, cache_size_mb)
+    
     # Try to load as an image first, since this is 'least intrusive'
     is_image = ImageFileReader.is_valid_image_file(video_source)
     if is_image:
@@ -403,12 +2117,13 @@ def make_video_reader(video_source):
     # Try video files
     is_video_file = VideoFileReader.is_valid_video_file(video_source)
     if is_video_file:
-        return "video", VideoFileReader(video_source)
+        return "video", VideoFileReader(video_source, prefetch_frames, cache_size_mb)
     
     # Check if source is an integer (implies webcam)
     is_webcam = video_source.isnumeric()
     if is_webcam:
-        return "webcam", VideoStreamReader(int(video_source))
+        WebcamReader = ThreadedStreamReader if stream_backend == "ffmpeg" else StreamReader
+        return "webcam", WebcamReader(int(video_source))
     
     # If we get here, assume we got an rtsp source which is otherwise hard to verify!
-    return "rtsp", VideoStreamReader(video_source)
\ No newline at end of file
+    return "rtsp", StreamReader(video_source)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import os.path as osp
+import argparse
+from time import perf_counter
+
+import cv2
+import numpy as np
+import onnxruntime
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+from lib.misc import get_file_to_path_lut
+from lib.video import get_image_sequence_paths
+from lib.depth_demo_wrapper import DepthDemo, write_depth_input
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Script args
+
+# Set script arg defaults
+default_models_folder = "models/depth"
+default_mode = "dynamic"
+default_num_frames = 32
+
+# Define script arguments
+parser = argparse.ArgumentParser(description="Create INT8 (quantized) copies of depth models, for faster CPU inference")
+parser.add_argument("-i", "--calibration_frames", required=True, type=str,
+                    help="Folder of sample images (or a glob pattern like '/path/to/*.jpg'), used for calibration"
+                         " and to compare the quantized models against the originals")
+parser.add_argument("-m", "--mode", default=default_mode, type=str, choices=["dynamic", "static", "both"],
+                    help="Quantization mode. 'dynamic' only quantizes weights ahead of time, 'static' also"
+                         " quantizes activations using the calibration frames (slower to build, usually faster"
+                         f" to run) (default: {default_mode})")
+parser.add_argument("-n", "--num_frames", default=default_num_frames, type=int,
+                    help=f"Maximum number of calibration frames to use (default: {default_num_frames})")
+parser.add_argument("-f", "--models_folder", default=default_models_folder, type=str,
+                    help=f"Folder containing depth models (default: {default_models_folder})")
+
+# For convenience
+args = parser.parse_args()
+arg_calibration_frames = args.calibration_frames
+arg_mode = args.mode
+arg_num_frames = args.num_frames
+arg_models_folder = args.models_folder
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Classes
+
+class DepthCalibrationReader(CalibrationDataReader):
+    
+    ''' Provides pre-processed frames to the onnxruntime static quantizer, one at a time '''
+    
+    def __init__(self, input_name, inputs_list):
+        self._input_name = input_name
+        self._inputs_iter = iter(inputs_list)
+    
+    def get_next(self):
+        input_nchw = next(self._inputs_iter, None)
+        return None if input_nchw is None else {self._input_name: input_nchw}
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Functions
+
+def make_session(model_path):
+    return onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+
+def run_model(model_path, inputs_list) -> tuple[float, list]:
+    
+    ''' Helper used to run a model on every input. Returns the median inference time (ms) & all outputs '''
+    
+    ort_session = make_session(model_path)
+    input_name = ort_session.get_inputs()[0].name
+    
+    # Run once before timing, since the first run is usually much slower
+    ort_session.run(None, {input_name: inputs_list[0]})
+    
+    times_ms_list, outputs_list = [], []
+    for input_nchw in inputs_list:
+        t1 = perf_counter()
+        depth_result = ort_session.run(None, {input_name: input_nchw})[0].squeeze()
+        t2 = perf_counter()
+        times_ms_list.append(1000 * (t2 - t1))
+        outputs_list.append(depth_result)
+    
+    return float(np.median(times_ms_list)), outputs_list
+
+def get_output_difference(reference_list, outputs_list) -> tuple[float, float]:
+    
+    '''
+    Helper used to compare depth outputs. Since depth-anything predicts relative depth, each
+    output is normalized to a 0-to-1 range before comparing (which is also how results are displayed)
+    Returns the mean & worst-case (per-frame) mean absolute difference
+    '''
+    
+    normalize = lambda depth: (depth - depth.min()) / max(depth.max() - depth.min(), 1e-6)
+    frame_diffs = [np.mean(np.abs(normalize(ref) - normalize(out))) for ref, out in zip(reference_list, outputs_list)]
+    
+    return float(np.mean(frame_diffs)), float(np.max(frame_diffs))
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Load calibration data
+
+# Load & pre-process calibration frames, using the same pre-processing as the demo
+image_paths_list = get_image_sequence_paths(arg_calibration_frames)
+if len(image_paths_list) == 0:
+    raise SystemExit(f"No images found for calibration: {arg_calibration_frames}")
+step_size = max(1, len(image_paths_list) // arg_num_frames)
+image_paths_list = image_paths_list[::step_size][:arg_num_frames]
+
+proc_w, proc_h = DepthDemo._proc_wh
+scaled_bgr = np.empty((proc_h, proc_w, 3), dtype=np.uint8)
+inputs_list = []
+for image_path in image_paths_list:
+    frame_bgr = cv2.imread(image_path)
+    if frame_bgr is None:
+        print(f"  Skipping unreadable image: {image_path}")
+        continue
+    input_nchw = np.empty((1, 3, proc_h, proc_w), dtype=np.float32)
+    inputs_list.append(write_depth_input(frame_bgr, scaled_bgr, input_nchw))
+if len(inputs_list) == 0:
+    raise SystemExit("Unable to read any calibration images!")
+print("", f"Loaded {len(inputs_list)} calibration frames", sep="\n", flush=True)
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Quantize models
+
+# Only quantize original (fp32) models
+name_to_path_dict = get_file_to_path_lut(arg_models_folder, allowable_exts = [".onnx"])
+name_to_path_dict = {name: path for name, path in name_to_path_dict.items() if "_int8" not in name}
+quant_modes_list = ["dynamic", "static"] if arg_mode == "both" else [arg_mode]
+
+report_lines = ["model, median ms, speedup, mean diff, worst diff"]
+for model_name, model_path in name_to_path_dict.items():
+    
+    print("", f"Running original model: {model_name}", sep="\n", flush=True)
+    fp32_ms, fp32_outputs = run_model(model_path, inputs_list)
+    report_lines.append(f"{model_name}, {fp32_ms:.1f}, 1.00x, 0.0000, 0.0000")
+    
+    for quant_mode in quant_modes_list:
+        
+        # Quantized models are saved beside the originals, so they show up as extra variants in the demo
+        quant_name = f"{model_name}_int8_{quant_mode}"
+        quant_path = osp.join(arg_models_folder, f"{quant_name}.onnx")
+        print(f"Quantizing ({quant_mode}): {quant_name}", flush=True)
+        if quant_mode == "dynamic":
+            quantize_dynamic(model_path, quant_path, weight_type=QuantType.QInt8)
+        else:
+            input_name = make_session(model_path).get_inputs()[0].name
+            calib_reader = DepthCalibrationReader(input_name, inputs_list)
+            quantize_static(model_path, quant_path, calib_reader, quant_format=QuantFormat.QDQ,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+        
+        # Compare against original
+        int8_ms, int8_outputs = run_model(quant_path, inputs_list)
+        mean_diff, worst_diff = get_output_difference(fp32_outputs, int8_outputs)
+        report_lines.append(f"{quant_name}, {int8_ms:.1f}, {fp32_ms / int8_ms:.2f}x, {mean_diff:.4f}, {worst_diff:.4f}")
+
+# Save & print report
+report_path = osp.join(arg_models_folder, "quantization_report.csv")
+with open(report_path, "w") as out_file:
+    out_file.write("\n".join(report_lines) + "\n")
+print("",
+      "Differences are the mean absolute difference of (0-to-1 normalized) depth, per frame",
+      "", *report_lines, "",
+      f"Report saved: {report_path}",
+      sep="\n", flush=True)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import numpy as np
+
+from lib.aruco_demo_wrapper import get_pyramid_level, refine_corners
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Tests
+
+def test_pyramid_level_fits_budget():
+    
+    assert get_pyramid_level((1080, 1920, 3), None) == 0
+    assert get_pyramid_level((1080, 1920, 3), 1920 * 1080) == 0
+    assert get_pyramid_level((1080, 1920, 3), 1920 * 1080 // 4) == 1
+    assert get_pyramid_level((1080, 1920, 3), 1920 * 1080 // 4 - 1) == 2
+
+def test_refine_corners_per_marker():
+    
+    # Draw two squares far apart, so that a single crop would cover most of the frame
+    frame = np.zeros((400, 400, 3), dtype=np.uint8)
+    frame[50:100, 50:100] = 255
+    frame[300:350, 300:350] = 255
+    true_xys = np.float32([[49.5, 49.5], [99.5, 49.5], [99.5, 99.5], [49.5, 99.5]])
+    true_xys = np.concatenate((true_xys, true_xys + 250))
+    
+    rough_xys = true_xys + 1.5
+    refined_xys = refine_corners(frame, rough_xys, search_radius_px = 4)
+    assert refined_xys.shape == (8, 2)
+    assert np.abs(refined_xys - true_xys).max() < np.abs(rough_xys - true_xys).max()
+    assert np.abs(refined_xys - true_xys).max() < 0.5
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import threading
+from time import perf_counter, sleep
+
+import pytest
+import numpy as np
+
+from lib.depth_processing import AsyncDepthRunner, get_depth_proc_wh
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Helpers
+
+class FakeDepthModel:
+    
+    '''
+    Stand-in for a DepthDemo, which (like the real model) writes every result into the same output buffer
+    Keeps track of how many threads are running the model at once
+    '''
+    
+    def __init__(self, delay_sec = 0.0, error = None):
+        self._output = np.zeros((4, 4), dtype = np.float32)
+        self._delay_sec = delay_sec
+        self._error = error
+        self._lock = threading.Lock()
+        self._num_running = 0
+        self.max_num_running = 0
+    
+    def process_frame(self, frame_bgr):
+        
+        with self._lock:
+            self._num_running += 1
+            self.max_num_running = max(self.max_num_running, self._num_running)
+        sleep(self._delay_sec)
+        with self._lock:
+            self._num_running -= 1
+        
+        if self._error is not None:
+            raise self._error
+        self._output[:] = frame_bgr.mean()
+        
+        return self._output
+    
+    def process_frames(self, frames_list):
+        return [self.process_frame(frame).copy() for frame in frames_list]
+
+def wait_for_depth(runner, frame, timeout_sec = 5.0):
+    
+    ''' Helper used to keep handing a frame to the runner until a depth result comes back '''
+    
+    t_end = perf_counter() + timeout_sec
+    while perf_counter() < t_end:
+        depth_result = runner.process_frame(frame)
+        if depth_result is not None:
+            return depth_result
+        sleep(0.01)
+    
+    return None
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Tests
+
+def test_async_results_are_not_overwritten():
+    
+    depth_model = FakeDepthModel()
+    runner = AsyncDepthRunner(depth_model, target_hz = 1000)
+    try:
+        frame = np.full((8, 8, 3), 5, dtype = np.uint8)
+        assert runner.process_frame(frame) is None
+        depth_result = wait_for_depth(runner, frame)
+        assert depth_result is not None and np.all(depth_result == 5)
+        
+        # Running the model again reuses its output buffer, which shouldn't affect earlier results
+        depth_model.process_frame(np.zeros_like(frame))
+        assert np.all(depth_result == 5)
+    finally:
+        runner.release()
+
+def test_async_errors_are_reraised():
+    
+    runner = AsyncDepthRunner(FakeDepthModel(error = ValueError("bad model")), target_hz = 1000)
+    try:
+        frame = np.zeros((8, 8, 3), dtype = np.uint8)
+        with pytest.raises(ValueError, match = "bad model"):
+            for _ in range(500):
+                runner.process_frame(frame)
+                sleep(0.01)
+    finally:
+        runner.release()
+
+def test_direct_processing_waits_for_worker():
+    
+    depth_model = FakeDepthModel(delay_sec = 0.02)
+    runner = AsyncDepthRunner(depth_model, target_hz = 1000)
+    try:
+        frame = np.full((8, 8, 3), 3, dtype = np.uint8)
+        for _ in range(5):
+            runner.process_frame(frame)
+            depth_results = runner.process_frames([frame, frame])
+        assert all(np.all(result == 3) for result in depth_results)
+        assert depth_model.max_num_running == 1
+    finally:
+        runner.release()
+
+def test_depth_proc_sizing_uses_whole_patches():
+    
+    # Default is a square processing size
+    assert get_depth_proc_wh((480, 640, 3)) == (518, 518)
+    
+    # Keeping aspect ratio should scale the longest side to the max side, with both sides in whole patches
+    assert get_depth_proc_wh((480, 640, 3), keep_aspect = True) == (518, 392)
+    assert get_depth_proc_wh((640, 480, 3), max_side_px = 252, keep_aspect = True) == (196, 252)
+    
+    # Very thin frames still need at least 1 patch on every side
+    assert get_depth_proc_wh((10, 1000, 3), keep_aspect = True) == (518, 14)
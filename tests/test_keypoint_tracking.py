@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import pytest
+import cv2
+import numpy as np
+
+from lib.keypoint_tracking import track_keypoints, count_visible_keypoints, get_keypoints_box, get_box_iou
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Tests
+
+def test_box_iou():
+    
+    assert get_box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert get_box_iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0.0
+    assert get_box_iou((0, 0, 10, 10), (5, 0, 15, 10)) == pytest.approx(50 / 150)
+    assert get_box_iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+
+def test_track_keypoints_follows_motion():
+    
+    # Make a textured frame, then shift it to simulate motion
+    rng = np.random.default_rng(0)
+    prev_gray = cv2.GaussianBlur(np.uint8(rng.integers(0, 255, (200, 200))), (5, 5), 0)
+    shift_x, shift_y = 3, 2
+    curr_gray = np.roll(prev_gray, (shift_y, shift_x), axis=(0, 1))
+    
+    keypoints = np.zeros((1, 17, 3), dtype=np.float32)
+    keypoints[0, :, 0] = np.linspace(60, 140, 17)
+    keypoints[0, :, 1] = 100
+    keypoints[0, :, 2] = 1.0
+    keypoints[0, 0, 2] = 0.0
+    
+    tracked_kpts, tracked_ratio = track_keypoints(prev_gray, curr_gray, keypoints)
+    assert tracked_ratio > 0.9
+    is_tracked = tracked_kpts[0, :, 2] > 0.5
+    moved_xys = tracked_kpts[0, is_tracked, 0:2] - keypoints[0, is_tracked, 0:2]
+    assert np.allclose(moved_xys, (shift_x, shift_y), atol = 0.5)
+    
+    # Hidden keypoints are left alone
+    assert tracked_kpts[0, 0, 2] == 0.0
+
+def test_track_keypoints_without_visible_points():
+    
+    blank_gray = np.zeros((50, 50), dtype=np.uint8)
+    keypoints = np.zeros((2, 17, 3), dtype=np.float32)
+    tracked_kpts, tracked_ratio = track_keypoints(blank_gray, blank_gray, keypoints)
+    
+    assert tracked_ratio == 1.0
+    assert np.array_equal(tracked_kpts, keypoints)
+
+def test_keypoint_box_and_visibility():
+    
+    keypoints = np.zeros((1, 17, 3), dtype=np.float32)
+    keypoints[0, 0] = (10, 20, 0.9)
+    keypoints[0, 1] = (30, 5, 0.8)
+    keypoints[0, 2] = (100, 100, 0.1)
+    
+    assert count_visible_keypoints(keypoints) == 2
+    assert get_keypoints_box(keypoints[0]) == (10, 5, 30, 20)
+    assert get_keypoints_box(np.zeros((17, 3), dtype=np.float32)) == (0, 0, 0, 0)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import threading
+from time import sleep
+
+import pytest
+
+from lib.misc import ModelCache, get_path_size_mb, split_thread_budget
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Tests
+
+def test_model_cache_evicts_least_recently_used():
+    
+    cache = ModelCache(max_memory_mb = 100)
+    cache.get("a", lambda: "model_a", size_mb = 40)
+    cache.get("b", lambda: "model_b", size_mb = 40)
+    
+    # Using 'a' again should make 'b' the first to be unloaded
+    assert cache.get("a", lambda: "reloaded_a", size_mb = 40) == "model_a"
+    cache.get("c", lambda: "model_c", size_mb = 40)
+    assert cache.get_memory_mb() == 80
+    assert cache.get("b", lambda: "reloaded_b", size_mb = 40) == "reloaded_b"
+    assert cache.get("a", lambda: "reloaded_a", size_mb = 40) == "reloaded_a"
+
+def test_model_cache_always_keeps_newest_model():
+    
+    cache = ModelCache(max_memory_mb = 10)
+    assert cache.get("big", lambda: "big_model", size_mb = 50) == "big_model"
+    assert cache.get("big", lambda: "reloaded", size_mb = 50) == "big_model"
+
+def test_model_cache_only_sizes_models_on_load():
+    
+    size_calls = []
+    get_size = lambda: size_calls.append(1) or 25.0
+    
+    cache = ModelCache(max_memory_mb = 100)
+    for _ in range(3):
+        cache.get("a", lambda: "model_a", size_mb = get_size)
+    assert len(size_calls) == 1
+    assert cache.get_memory_mb() == 25.0
+
+def test_model_cache_loads_once_when_shared_between_threads():
+    
+    load_calls = []
+    def slow_load():
+        load_calls.append(1)
+        sleep(0.1)
+        return "model"
+    
+    cache = ModelCache()
+    results_list = []
+    get_model = lambda: results_list.append(cache.get("a", slow_load, size_mb = 1))
+    threads_list = [threading.Thread(target = get_model) for _ in range(4)]
+    for thread in threads_list:
+        thread.start()
+    for thread in threads_list:
+        thread.join()
+    
+    assert len(load_calls) == 1
+    assert results_list == ["model"] * 4
+
+def test_path_size_includes_folder_contents(tmp_path):
+    
+    (tmp_path / "model.bin").write_bytes(bytes(1000))
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "weights.bin").write_bytes(bytes(500))
+    
+    assert get_path_size_mb(str(tmp_path / "model.bin")) == 0.001
+    assert get_path_size_mb(str(tmp_path)) == 0.0015
+
+@pytest.mark.parametrize("total_threads", [3, 4, 7, 8, 16, 33])
+def test_split_thread_budget_sums_to_total(total_threads):
+    
+    thread_budget = split_thread_budget(total_threads, {"depth": 2, "pose": 2, "opencv": 1})
+    assert sum(thread_budget.values()) == total_threads
+    assert all(num_threads >= 1 for num_threads in thread_budget.values())
+
+def test_split_thread_budget_follows_weights():
+    
+    thread_budget = split_thread_budget(8, {"depth": 2, "pose": 2, "opencv": 1})
+    assert thread_budget == {"depth": 3, "pose": 3, "opencv": 2}
+    
+    # Everyone gets at least 1 thread, even with tiny weights
+    assert split_thread_budget(4, {"a": 10, "b": 1, "c": 1}) == {"a": 2, "b": 1, "c": 1}
+
+def test_split_thread_budget_needs_a_thread_per_user():
+    with pytest.raises(AssertionError):
+        split_thread_budget(2, {"depth": 2, "pose": 2, "opencv": 1})
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import pytest
+import numpy as np
+
+from lib.shared_frames import get_fork_context
+from lib.model_process import ModelProcess
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Helpers
+
+needs_fork = pytest.mark.skipif(get_fork_context() is None, reason = "Forking isn't supported on this platform")
+
+class DummyModel:
+    
+    '''
+    Stand-in for a model wrapper. Depending on the selected model, results are either
+    a single array (like depth maps) or compact python data (like pose keypoints)
+    '''
+    
+    def __init__(self):
+        self._model_select = "array"
+        self._offset = 0
+    
+    def get_model_names(self):
+        return ["array", "compact", "error"]
+    
+    def set_model_select(self, model_select):
+        self._model_select = model_select
+    
+    def set_offset(self, offset):
+        self._offset = offset
+    
+    def process_frame(self, frame):
+        if self._model_select == "error":
+            raise ValueError("bad frame")
+        if self._model_select == "compact":
+            return {"mean": float(frame.mean()), "offset": self._offset}
+        return np.full(frame.shape[0:2], frame.mean() + self._offset, dtype = np.float32)
+    
+    def draw_results(self, results, frame):
+        return "drawn locally"
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Tests
+
+@needs_fork
+def test_array_results_remain_valid():
+    
+    model_proc = ModelProcess(DummyModel(), num_slots = 3, timeout_sec = 10)
+    try:
+        frames_list = [np.full((6, 8, 3), value, dtype = np.uint8) for value in range(1, 6)]
+        results_list = model_proc.process_frames(frames_list)
+        
+        # Results should be owned copies, not views into (re-used) shared memory
+        assert [float(result[0,0]) for result in results_list] == [1, 2, 3, 4, 5]
+        assert all(result.shape == (6, 8) for result in results_list)
+        assert all(result.base is None for result in results_list)
+        
+        # Frame shape changes should re-allocate shared memory on both sides
+        result = model_proc.process_frame(np.full((3, 4, 3), 7, dtype = np.uint8))
+        assert result.shape == (3, 4) and float(result[0,0]) == 7
+    finally:
+        model_proc.release()
+
+@needs_fork
+def test_selection_and_settings_reach_worker():
+    
+    model_proc = ModelProcess(DummyModel(), timeout_sec = 10)
+    try:
+        frame = np.full((6, 8, 3), 2, dtype = np.uint8)
+        model_proc.call_method("set_offset", 10)
+        model_proc.set_model_select("compact")
+        assert model_proc.process_frame(frame) == {"mean": 2.0, "offset": 10}
+        
+        model_proc.set_model_select("array")
+        assert float(model_proc.process_frame(frame)[0,0]) == 12.0
+        assert model_proc.draw_results(None, frame) == "drawn locally"
+    finally:
+        model_proc.release()
+
+@needs_fork
+def test_worker_errors_are_reraised():
+    
+    model_proc = ModelProcess(DummyModel(), timeout_sec = 10)
+    try:
+        frame = np.zeros((6, 8, 3), dtype = np.uint8)
+        model_proc.set_model_select("error")
+        with pytest.raises(RuntimeError, match = "bad frame"):
+            model_proc.process_frame(frame)
+        
+        # Worker should keep running after an error
+        model_proc.set_model_select("compact")
+        assert model_proc.process_frame(frame)["mean"] == 0.0
+    finally:
+        model_proc.release()
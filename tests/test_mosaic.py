@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import numpy as np
+
+from lib.mosaic import StreamMosaic, get_grid_shape, get_tile_max_side
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Helpers
+
+FRAME_SHAPE = (40, 60, 3)
+
+class DummyReader:
+    
+    ''' Stand-in for a frame reader, which hands out frames filled with the number of frames read so far '''
+    
+    def __init__(self, frame_shape = FRAME_SHAPE):
+        self._shape = frame_shape
+        self.read_count = 0
+        self.is_released = False
+    
+    def __iter__(self): return self
+    
+    def __next__(self):
+        self.read_count += 1
+        return np.full(self._shape, self.read_count, dtype = np.uint8)
+    
+    def get_shape(self): return self._shape
+    def is_reconnecting(self): return False
+    def release(self): self.is_released = True
+
+class DummyLatestReader(DummyReader):
+    
+    ''' Stand-in for a threaded reader, which only has a frame available when told to '''
+    
+    def __init__(self, frame_shape = FRAME_SHAPE):
+        super().__init__(frame_shape)
+        self.has_new_frame = False
+    
+    def read_latest(self):
+        if not self.has_new_frame:
+            return False, None
+        self.has_new_frame = False
+        return True, next(self)
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Tests
+
+def test_read_repeats_frames_until_new_frames_arrive():
+    
+    blocking_reader, latest_reader = DummyReader(), DummyLatestReader()
+    mosaic = StreamMosaic([blocking_reader, latest_reader])
+    
+    # Readers without read_latest are always read, others only report frames once available
+    (is_new_1, frame_1), (is_new_2, frame_2) = mosaic.read()
+    assert is_new_1 and frame_1[0,0,0] == 1
+    assert not is_new_2 and frame_2 is None
+    
+    latest_reader.has_new_frame = True
+    _, (is_new_2, frame_2) = mosaic.read()
+    assert is_new_2 and frame_2[0,0,0] == 1
+    
+    _, (is_new_2, repeated_frame_2) = mosaic.read()
+    assert not is_new_2 and repeated_frame_2 is frame_2
+    assert blocking_reader.read_count == 3
+    
+    mosaic.release()
+    assert blocking_reader.is_released and latest_reader.is_released
+
+def test_mosaic_sizing():
+    
+    # 3 streams are laid out on a 2x2 grid
+    mosaic = StreamMosaic([DummyReader() for _ in range(3)])
+    frame_h, frame_w = FRAME_SHAPE[0:2]
+    assert mosaic.get_shape() == (2 * frame_h, 2 * frame_w, 3)
+    assert mosaic.get_tile_wh(max_side_px = 60) == (30, 20)
+    
+    # Grid spots without a stream are filled in with blank tiles
+    tile_frames = [np.full((80, 120, 3), 255, dtype = np.uint8)] * 3
+    mosaic_frame = mosaic.make_mosaic(tile_frames)
+    assert mosaic_frame.shape == (160, 240, 3)
+    assert np.all(mosaic_frame[-1, -1] == 0) and np.all(mosaic_frame[-1, 0] == 255)
+
+def test_missing_tiles_use_tile_size():
+    
+    # Before any frames arrive, blank tiles should match the display tile size, not the source size
+    mosaic = StreamMosaic([DummyLatestReader(), DummyLatestReader()])
+    tile_frames = [frame for _, frame in mosaic.read()]
+    assert tile_frames == [None, None]
+    
+    mosaic_frame = mosaic.make_mosaic(tile_frames, tile_wh = (30, 20))
+    assert mosaic_frame.shape == (20, 60, 3)
+
+def test_grid_shape():
+    
+    assert get_grid_shape(1) == (1, 1)
+    assert get_grid_shape(2) == (1, 2)
+    assert get_grid_shape(3) == (2, 2)
+    assert get_grid_shape(5) == (2, 3)
+    assert get_grid_shape(9) == (3, 3)
+
+def test_tile_max_side_matches_mosaic():
+    
+    # Readers may be created already scaled to the tile size, so this needs to match the mosaic sizing
+    for num_streams in (1, 2, 3, 5):
+        mosaic = StreamMosaic([DummyReader() for _ in range(num_streams)])
+        frame_h, frame_w = FRAME_SHAPE[0:2]
+        tile_max_side = get_tile_max_side(num_streams, (frame_w, frame_h), max_side_px = 500)
+        assert tile_max_side == max(mosaic.get_tile_wh(max_side_px = 500))
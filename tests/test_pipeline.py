@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import threading
+from time import sleep
+
+import pytest
+
+from lib.pipeline import BoundedQueue, FramePipeline, PipelineStage
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Helpers
+
+def fill_queue(drop_mode, items_list, max_size = 2):
+    
+    stop_event = threading.Event()
+    queue = BoundedQueue(max_size, drop_mode)
+    for item in items_list:
+        queue.put(item, stop_event)
+    
+    queued_list = []
+    while True:
+        is_ok, item = queue.get(stop_event, timeout_sec = 0)
+        if not is_ok:
+            break
+        queued_list.append(item)
+    
+    return queued_list, queue.get_num_dropped()
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Tests
+
+def test_drop_oldest_keeps_newest_items():
+    assert fill_queue("drop_oldest", [1, 2, 3, 4]) == ([3, 4], 2)
+
+def test_drop_newest_keeps_queued_items():
+    assert fill_queue("drop_newest", [1, 2, 3, 4]) == ([1, 2], 2)
+
+def test_block_gives_up_on_stop():
+    
+    stop_event = threading.Event()
+    queue = BoundedQueue(1, "block")
+    assert queue.put(1, stop_event)
+    
+    stop_event.set()
+    assert not queue.put(2, stop_event)
+    assert queue.get_num_dropped() == 0
+
+def test_forced_items_are_never_dropped():
+    
+    stop_event = threading.Event()
+    queue = BoundedQueue(1, "drop_newest")
+    queue.put(1, stop_event)
+    queue.put(2, stop_event, force = True)
+    
+    assert [queue.get(stop_event, timeout_sec = 0)[1] for _ in range(2)] == [1, 2]
+
+def test_pipeline_runs_stages_in_order():
+    
+    source_iter = iter(range(5))
+    pipeline = FramePipeline(lambda: next(source_iter), [
+        PipelineStage("double", lambda x: 2 * x),
+        PipelineStage("add", lambda x: x + 1),
+    ]).start()
+    
+    outputs_list = []
+    while True:
+        output = pipeline.get(timeout_sec = 5)
+        if output is None:
+            break
+        outputs_list.append(output)
+    pipeline.stop()
+    
+    assert outputs_list == [1, 3, 5, 7, 9]
+
+def test_pipeline_reraises_stage_errors():
+    
+    def fail_on_two(x):
+        if x == 2: raise ValueError("bad item")
+        return x
+    
+    source_iter = iter(range(5))
+    pipeline = FramePipeline(lambda: next(source_iter), [PipelineStage("check", fail_on_two)]).start()
+    try:
+        assert [pipeline.get(timeout_sec = 5) for _ in range(2)] == [0, 1]
+        with pytest.raises(ValueError, match = "bad item"):
+            pipeline.get(timeout_sec = 5)
+    finally:
+        pipeline.stop()
+
+def test_stop_waits_for_source():
+    
+    # Source takes longer than the stage timeout, which stop should still wait for
+    source_done_event = threading.Event()
+    def slow_source():
+        sleep(0.3)
+        source_done_event.set()
+        return 1
+    
+    pipeline = FramePipeline(slow_source, [PipelineStage("pass", lambda x: x)]).start()
+    sleep(0.05)
+    pipeline.stop(stage_timeout_sec = 0.01)
+    assert source_done_event.is_set()
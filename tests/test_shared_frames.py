@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+from time import perf_counter, sleep
+from multiprocessing import shared_memory
+
+import pytest
+import numpy as np
+
+from lib.shared_frames import SharedFrameRing, get_fork_context
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Helpers
+
+FRAME_SHAPE = (8, 6, 3)
+
+# Shared memory is only passed to forked child processes in this repo
+mp_ctx = get_fork_context()
+needs_fork = pytest.mark.skipif(mp_ctx is None, reason = "Forking isn't supported on this platform")
+
+def write_frames(ring: SharedFrameRing, shm_name: str, num_frames: int) -> None:
+    
+    ''' Runs in a child process, writing frames filled with their frame count '''
+    
+    ring.attach(shm_name, FRAME_SHAPE)
+    for frame_count in range(1, num_frames + 1):
+        slot_idx, slot_frame = ring.claim_write_slot()
+        slot_frame[:] = frame_count
+        ring.publish(slot_idx, frame_count, capture_time = 1.5, decode_ms = 2.5)
+    ring.close()
+    
+    return
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Tests
+
+@needs_fork
+def test_frames_pass_between_processes():
+    
+    ring = SharedFrameRing(3, mp_ctx)
+    shm_name = ring.allocate(FRAME_SHAPE)
+    proc = mp_ctx.Process(target = write_frames, args = (ring, shm_name, 5))
+    proc.start()
+    proc.join(timeout = 10)
+    
+    frame_count, frame, frame_timing = ring.read_newest(0, timeout_sec = 5)
+    assert frame_count == 5
+    assert np.all(frame == 5)
+    assert frame_timing == (1.5, 2.5)
+    assert not frame.flags.writeable
+    ring.close()
+
+@needs_fork
+def test_child_attach_leaves_memory_registered_to_owner():
+    
+    # A child process that attaches & exits must not cause the memory to be cleaned up
+    ring = SharedFrameRing(3, mp_ctx)
+    shm_name = ring.allocate(FRAME_SHAPE)
+    proc = mp_ctx.Process(target = write_frames, args = (ring, shm_name, 1))
+    proc.start()
+    proc.join(timeout = 10)
+    sleep(0.25)
+    
+    check_shm = shared_memory.SharedMemory(name = shm_name)
+    check_shm.close()
+    ring.close()
+
+def test_writer_never_claims_read_or_newest_slot():
+    
+    ring = SharedFrameRing(3)
+    ring.allocate(FRAME_SHAPE)
+    for frame_count in (1, 2):
+        slot_idx, _ = ring.claim_write_slot()
+        ring.publish(slot_idx, frame_count)
+    
+    # Reader holds the newest slot (frame 2), then the writer publishes another frame
+    _, held_frame, _ = ring.read_newest(0, timeout_sec = 0)
+    held_slot_idx = next(idx for idx, slot in enumerate(ring._slots) if np.shares_memory(slot, held_frame))
+    slot_idx, _ = ring.claim_write_slot()
+    ring.publish(slot_idx, 3)
+    for _ in range(5):
+        slot_idx, _ = ring.claim_write_slot()
+        assert slot_idx not in (held_slot_idx, ring._latest_slot.value)
+    ring.close()
+
+def test_read_without_new_frames():
+    
+    ring = SharedFrameRing(3)
+    ring.allocate(FRAME_SHAPE)
+    slot_idx, _ = ring.claim_write_slot()
+    ring.publish(slot_idx, 1)
+    
+    assert ring.read_newest(0, timeout_sec = 0)[0] == 1
+    frame_count, frame, _ = ring.read_newest(1, timeout_sec = 0)
+    assert (frame_count, frame) == (1, None)
+    
+    # Closing the ring wakes up readers, rather than waiting for the timeout
+    ring.mark_closed()
+    t1 = perf_counter()
+    assert ring.read_newest(1, timeout_sec = 5)[1] is None
+    assert perf_counter() - t1 < 1.0
+    ring.close()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Imports
+
+import os
+import os.path as osp
+import sys
+import json
+import shutil
+import threading
+from time import perf_counter, sleep
+
+import pytest
+import cv2
+import numpy as np
+
+from lib.video import VideoStreamReader, VideoFileReader
+from lib.video import load_keyframe_index, find_keyframe_before, find_nearest_keyframe
+from lib.video import ImageSequenceReader, get_image_sequence_paths
+from lib.video import FFmpegStreamReader, make_ffmpeg_rawvideo_cmd, read_pipe_into
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Helpers
+
+NUM_FRAMES = 20
+FRAME_WH = (32, 24)
+
+@pytest.fixture
+def video_path(tmp_path):
+    
+    ''' Writes a short video where every frame is filled with (10 * frame index), so frames can be identified '''
+    
+    video_path = str(tmp_path / "test_video.avi")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"MJPG"), 10, FRAME_WH)
+    if not writer.isOpened():
+        pytest.skip("Unable to write test video")
+    
+    frame_w, frame_h = FRAME_WH
+    for frame_idx in range(NUM_FRAMES):
+        writer.write(np.full((frame_h, frame_w, 3), 10 * frame_idx, dtype = np.uint8))
+    writer.release()
+    
+    return video_path
+
+def get_frame_index(frame) -> int:
+    ''' Recovers the index of a frame written by the video_path fixture (frames are lossy, so round) '''
+    return int(round(float(frame.mean()) / 10))
+
+def read_indexes(reader, num_frames: int) -> list[int]:
+    
+    frame_idxs = []
+    for _ in range(num_frames):
+        read_ok, frame = reader.read()
+        assert read_ok
+        frame_idxs.append(get_frame_index(frame))
+    
+    return frame_idxs
+
+@pytest.fixture
+def images_folder(tmp_path):
+    
+    ''' Writes a folder of images filled with (10 * image index), named so that only natural sorting orders them '''
+    
+    frame_w, frame_h = FRAME_WH
+    for frame_idx in range(12):
+        image_path = str(tmp_path / f"img_{frame_idx}.png")
+        cv2.imwrite(image_path, np.full((frame_h, frame_w, 3), 10 * frame_idx, dtype = np.uint8))
+    (tmp_path / "notes.txt").write_text("not an image")
+    
+    return tmp_path
+
+def make_fake_ffmpeg_cmd(frame_shape, num_frames: int) -> list[str]:
+    
+    ''' Makes a command which mimics ffmpeg, writing raw frames (filled with frame number) then staying open '''
+    
+    frame_nbytes = int(np.prod(frame_shape))
+    script = "\n".join(["import sys, time",
+                        f"for frame_number in range(1, {num_frames + 1}):",
+                        f"    sys.stdout.buffer.write(bytes([frame_number]) * {frame_nbytes})",
+                        "sys.stdout.buffer.flush()",
+                        "time.sleep(30)"])
+    
+    return [sys.executable, "-c", script]
+
+def wait_for(check_func, timeout_sec = 10.0) -> bool:
+    
+    t_end = perf_counter() + timeout_sec
+    while not check_func():
+        if perf_counter() > t_end:
+            return False
+        sleep(0.01)
+    
+    return True
+
+class CountingCapture:
+    
+    ''' Wrapper around a video capture, used to count how many times the capture is seeked '''
+    
+    def __init__(self, cap):
+        self._cap = cap
+        self.num_seeks = 0
+    
+    def set(self, prop_id, value):
+        self.num_seeks += int(prop_id == cv2.CAP_PROP_POS_FRAMES)
+        return self._cap.set(prop_id, value)
+    
+    def __getattr__(self, name):
+        return getattr(self._cap, name)
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#%% Tests
+
+def test_find_keyframes():
+    
+    keyframe_idxs = [0, 10, 20]
+    assert find_keyframe_before(keyframe_idxs, 15) == 10
+    assert find_keyframe_before(keyframe_idxs, 10) == 10
+    assert find_keyframe_before([5, 10], 2) is None
+    assert find_nearest_keyframe(keyframe_idxs, 14) == 10
+    assert find_nearest_keyframe(keyframe_idxs, 16) == 20
+    assert find_nearest_keyframe(keyframe_idxs, 99) == 20
+    assert find_nearest_keyframe([], 5) is None
+
+def test_saved_keyframe_index_is_reused(video_path):
+    
+    # Saved index should be used as-is when the file info matches, without needing ffprobe
+    file_info = {"size": osp.getsize(video_path), "mtime": osp.getmtime(video_path)}
+    with open(f"{video_path}.keyframes.json", "w") as out_file:
+        json.dump({"file_info": file_info, "keyframes": [0, 7, 14]}, out_file)
+    
+    assert load_keyframe_index(video_path) == [0, 7, 14]
+
+@pytest.mark.parametrize("prefetch_frames", [0, 3])
+def test_seek_matches_sequential_reads(video_path, prefetch_frames):
+    
+    reader = VideoFileReader(video_path, prefetch_frames = prefetch_frames)
+    try:
+        assert read_indexes(reader, 5) == [0, 1, 2, 3, 4]
+        
+        # Seek forward & backward
+        reader.set_playback_position(12 / NUM_FRAMES)
+        assert read_indexes(reader, 3) == [12, 13, 14]
+        reader.set_playback_position(3 / NUM_FRAMES)
+        assert read_indexes(reader, 2) == [3, 4]
+    finally:
+        reader.release()
+
+def test_seek_decodes_forward_from_keyframe(video_path):
+    
+    reader = VideoFileReader(video_path)
+    try:
+        # Pretend every 10th frame is a keyframe, so a short jump forward can be decoded without seeking
+        reader._keyframe_idxs = [0, 10]
+        reader.cap = CountingCapture(reader.cap)
+        assert read_indexes(reader, 2) == [0, 1]
+        reader.set_playback_position(6 / NUM_FRAMES)
+        assert read_indexes(reader, 1) == [6]
+        assert reader.cap.num_seeks == 0
+        
+        # Jumping back past the capture position (or past a keyframe) requires a real seek
+        reader.set_playback_position(2 / NUM_FRAMES)
+        assert read_indexes(reader, 1) == [2]
+        reader.set_playback_position(15 / NUM_FRAMES)
+        assert read_indexes(reader, 1) == [15]
+        assert reader.cap.num_seeks == 2
+    finally:
+        reader.release()
+
+def test_cached_frames_are_reused_and_read_only(video_path):
+    
+    # Size the cache to hold 3 frames
+    frame_w, frame_h = FRAME_WH
+    cache_size_mb = 3.5 * (frame_w * frame_h * 3) / (2 ** 20)
+    reader = VideoFileReader(video_path, cache_size_mb = cache_size_mb)
+    try:
+        assert read_indexes(reader, 5) == [0, 1, 2, 3, 4]
+        assert sorted(reader._frame_cache.keys()) == [2, 3, 4]
+        
+        # Cached reads shouldn't touch the capture
+        reader.set_playback_position(3 / NUM_FRAMES)
+        read_ok, frame = reader.read()
+        assert read_ok and get_frame_index(frame) == 3
+        assert not frame.flags.writeable
+        assert reader._cap_frame_idx == 5
+        
+        # Uncached frames are decoded as usual & evict the least recently used frame (2)
+        reader.set_playback_position(0)
+        assert read_indexes(reader, 1) == [0]
+        assert sorted(reader._frame_cache.keys()) == [0, 3, 4]
+    finally:
+        reader.release()
+
+def test_keyframe_indexing_only_starts_when_scrubbing(video_path):
+    
+    reader = VideoFileReader(video_path)
+    try:
+        reader.set_playback_position(0.5)
+        assert reader._keyframe_thread is None
+        
+        reader.scrub_to(0.25)
+        assert reader._keyframe_thread is not None
+        reader._keyframe_thread.join(timeout = 10)
+        assert read_indexes(reader, 1)[0] in range(NUM_FRAMES)
+    finally:
+        reader.release()
+
+def test_image_sequence_paths_are_naturally_sorted(images_folder):
+    
+    image_names = [osp.basename(path) for path in get_image_sequence_paths(str(images_folder))]
+    assert image_names == [f"img_{idx}.png" for idx in range(12)]
+    
+    glob_names = [osp.basename(path) for path in get_image_sequence_paths(str(images_folder / "img_1*.png"))]
+    assert glob_names == ["img_1.png", "img_10.png", "img_11.png"]
+
+def test_image_sequence_loops_and_seeks(images_folder):
+    
+    reader = ImageSequenceReader(str(images_folder), read_ahead_frames = 4)
+    try:
+        frame_idxs = [get_frame_index(next(reader)) for _ in range(14)]
+        assert frame_idxs == [*range(12), 0, 1]
+        
+        reader.set_playback_position(0.5)
+        frame = next(reader)
+        assert get_frame_index(frame) == 6
+        assert not frame.flags.writeable
+    finally:
+        reader.release()
+
+def test_image_sequence_skips_unreadable_images(images_folder):
+    
+    (images_folder / "img_3.png").write_bytes(b"not a png")
+    
+    reader = ImageSequenceReader(str(images_folder))
+    try:
+        frame_idxs = [get_frame_index(next(reader)) for _ in range(4)]
+        assert frame_idxs == [0, 1, 2, 4]
+    finally:
+        reader.release()
+
+def test_ffmpeg_cmd_includes_filters():
+    
+    ffmpeg_cmd = make_ffmpeg_rawvideo_cmd("rtsp://camera/stream", ["scale=16:12", "fps=5"])
+    assert ffmpeg_cmd[0] == "ffmpeg"
+    assert ffmpeg_cmd[ffmpeg_cmd.index("-rtsp_transport") + 1] == "tcp"
+    assert ffmpeg_cmd[ffmpeg_cmd.index("-vf") + 1] == "scale=16:12,fps=5"
+    assert ffmpeg_cmd[-5:] == ["-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+    
+    file_cmd = make_ffmpeg_rawvideo_cmd("video.mp4", [])
+    assert "-vf" not in file_cmd and "-rtsp_transport" not in file_cmd
+
+def test_read_pipe_into():
+    
+    read_fd, write_fd = os.pipe()
+    with open(read_fd, "rb", buffering = 0) as read_pipe:
+        os.write(write_fd, bytes(range(10)))
+        buffer = bytearray(6)
+        assert read_pipe_into(read_pipe, buffer)
+        assert buffer == bytes(range(6))
+        
+        # Only 4 bytes left, so buffer can't be filled once the pipe closes
+        os.close(write_fd)
+        assert not read_pipe_into(read_pipe, buffer)
+
+def test_ffmpeg_reader_returns_newest_frame(video_path):
+    
+    # Shrink frames to fit max side length (even sizes, for ffmpeg)
+    reader = FFmpegStreamReader(video_path, max_side_px = 16)
+    frame_shape = reader.get_shape()
+    assert frame_shape == (12, 16, 3)
+    assert "scale=16:12" in reader._ffmpeg_cmd
+    
+    # Swap out ffmpeg for a script that writes frames without needing ffmpeg
+    reader._ffmpeg_cmd = make_fake_ffmpeg_cmd(frame_shape, num_frames = 5)
+    try:
+        iter(reader)
+        assert wait_for(lambda: reader._frame_count == 5)
+        
+        read_ok, frame = reader.read()
+        assert read_ok and frame.shape == frame_shape
+        assert np.all(frame == 5) and not frame.flags.writeable
+        assert reader.get_num_dropped_frames() == 4
+        
+        is_new_frame, repeated_frame = reader.read_latest()
+        assert not is_new_frame and repeated_frame is frame
+    finally:
+        reader.release()
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason = "ffmpeg isn't installed")
+def test_ffmpeg_reader_decodes_video(video_path):
+    
+    reader = FFmpegStreamReader(video_path, max_side_px = 16)
+    try:
+        frame = next(iter(reader))
+        assert frame.shape == (12, 16, 3)
+        assert get_frame_index(frame) in range(NUM_FRAMES)
+    finally:
+        reader.release()
+
+def test_reconnecting_reader_waits_between_repeated_frames(video_path):
+    
+    reader = VideoStreamReader(video_path)
+    try:
+        # Pretend we lost connection after reading a frame
+        last_frame = np.zeros((4, 4, 3), dtype = np.uint8)
+        reader._last_frame = last_frame
+        reader._reconnect_thread = threading.Thread(target = sleep, args = (0.5,), daemon = True)
+        reader._reconnect_thread.start()
+        
+        # Repeated frames should be handed out with a short wait, so callers don't spin
+        t1 = perf_counter()
+        repeated_frames = [next(reader) for _ in range(3)]
+        t2 = perf_counter()
+        assert all(frame is last_frame for frame in repeated_frames)
+        assert (t2 - t1) >= 2 * reader._reconnect_poll_sec
+        assert reader.is_reconnecting()
+    finally:
+        reader.release()
+
+def test_reconnect_refreshes_frame_shape(video_path):
+    
+    reader = VideoStreamReader(video_path, reconnect_delay_sec = 0.01)
+    try:
+        reader._shape = (1, 1, 3)
+        assert reader._reconnect()
+        assert reader.get_shape() == (FRAME_WH[1], FRAME_WH[0], 3)
+        assert reader.cap.isOpened()
+    finally:
+        reader.release()